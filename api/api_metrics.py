@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Métricas Prometheus de la API: latencia por endpoint y por paso al encolar
+"""
+
+import time
+
+from flask import g, request
+from prometheus_client import Counter, Histogram
+
+# Cubos de segundos: de operaciones de Redis (ms) a peticiones lentas
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_SECONDS = Histogram(
+    'tts_api_request_seconds',
+    'Duración de las peticiones HTTP de la API',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+ENQUEUE_SECONDS = Histogram(
+    'tts_api_enqueue_seconds',
+    'Duración de cada paso al encolar un trabajo (dedup, redis, publish)',
+    ['step'], buckets=LATENCY_BUCKETS
+)
+ENQUEUED_JOBS = Counter(
+    'tts_api_enqueued_jobs_total',
+    'Trabajos recibidos por la API, por prioridad y resultado',
+    ['priority', 'result']
+)
+
+
+def instrument(app):
+    """Medir todas las peticiones de la aplicación Flask"""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.monotonic()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUEST_SECONDS.labels(
+                request.endpoint or 'unknown', request.method, response.status_code
+            ).observe(time.monotonic() - started)
+        return response
+
+    return app
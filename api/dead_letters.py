@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Inspección y reenvío de los trabajos de la cola tts_dead
+"""
+
+import json
+from datetime import datetime
+import logging
+
+import pika
+
+logger = logging.getLogger(__name__)
+
+DEAD_QUEUE = 'tts_dead'
+# Campos del fallo que se quitan al reenviar un trabajo
+FAILURE_FIELDS = ('attempts', 'error', 'error_type', 'failed_at', 'next_retry_at')
+
+
+def is_job(message):
+    """Trabajo TTS (los mensajes con "type", como template_prerender, no lo son)"""
+    return bool(message.get('job_id')) and 'type' not in message
+
+
+def describe(body, headers):
+    """Resumen de un mensaje muerto para la API y el dashboard"""
+    try:
+        message = json.loads(body)
+    except ValueError:
+        message = {}
+    if not isinstance(message, dict):
+        message = {}
+    return {
+        'job_id': message.get('job_id'),
+        'type': message.get('type', 'tts'),
+        'phone_number': message.get('phone_number'),
+        'text': (message.get('text') or '')[:100],
+        'template_id': message.get('template_id'),
+        'created_at': message.get('created_at'),
+        'source_queue': headers.get('x-source-queue'),
+        'error': headers.get('x-error'),
+        'error_type': headers.get('x-error-type'),
+        'attempts': headers.get('x-attempts'),
+        'dead_at': headers.get('x-dead-at'),
+    }
+
+
+def fetch(channel, limit):
+    """Tomar hasta `limit` mensajes sin confirmar: [(delivery_tag, body, headers)]"""
+    messages = []
+    while len(messages) < limit:
+        method, properties, body = channel.basic_get(DEAD_QUEUE, auto_ack=False)
+        if method is None:
+            break
+        messages.append((method.delivery_tag, body, (properties.headers or {})))
+    return messages
+
+
+def abandon(channel):
+    """Cerrar el canal tras un error: RabbitMQ devuelve a la cola lo no confirmado"""
+    try:
+        channel.close()
+    except Exception:
+        pass
+
+
+def peek(channel, limit=50):
+    """
+    Ver los primeros trabajos muertos sin sacarlos de la cola.
+
+    Los mensajes se devuelven con nack(requeue) y RabbitMQ los deja en su
+    posición original.
+    """
+    try:
+        messages = fetch(channel, limit)
+        if messages:
+            channel.basic_nack(delivery_tag=messages[-1][0], multiple=True, requeue=True)
+    except Exception:
+        abandon(channel)
+        raise
+    return [describe(body, headers) for _, body, headers in messages]
+
+
+def replay(channel, job_ids=None, limit=100, scan_limit=1000):
+    """
+    Reenviar trabajos muertos a su cola de origen con el contador de
+    intentos a cero.
+
+    Con job_ids solo esos (buscados entre los primeros scan_limit mensajes);
+    sin job_ids, los primeros `limit`. channel debe ser transaccional: las
+    publicaciones y las confirmaciones se aplican juntas en tx_commit, así
+    que un trabajo nunca queda duplicado ni perdido. Devuelve los mensajes
+    reenviados [(cola, mensaje)], trabajos o no (ver is_job).
+    """
+    wanted = set(job_ids) if job_ids else None
+    replayed = []
+
+    try:
+        messages = fetch(channel, scan_limit if wanted else limit)
+        for delivery_tag, body, headers in messages:
+            try:
+                message = json.loads(body)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+                continue
+            if wanted is not None and message.get('job_id') not in wanted:
+                channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+                continue
+
+            source = headers.get('x-source-queue') or 'tts_calls'
+            for field in FAILURE_FIELDS:
+                message.pop(field, None)
+            message['replayed_at'] = datetime.now().isoformat()
+            channel.basic_publish(
+                exchange='',
+                routing_key=source,
+                body=json.dumps(message),
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    message_id=message.get('job_id')
+                )
+            )
+            channel.basic_ack(delivery_tag=delivery_tag)
+            replayed.append((source, message))
+        channel.tx_commit()
+    except Exception:
+        # Sin tx_commit no se aplica nada: ni reenvíos ni confirmaciones
+        abandon(channel)
+        raise
+
+    logger.info(f"♻️ {len(replayed)} trabajos muertos reenviados")
+    return replayed
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Supresión de trabajos duplicados al encolar: Idempotency-Key y ventana por
+(teléfono, texto)
+"""
+
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_PREFIX = 'idem:key:'
+DEDUP_KEY_PREFIX = 'idem:call:'
+IDEMPOTENCY_KEY_MAX_CHARS = 255
+
+# KEYS: claves de reclamo; ARGV: job_id y el TTL de cada clave. Si alguna
+# clave ya tiene dueño devuelve su job_id sin tocar nada; si no, todas pasan
+# a ser del trabajo nuevo. Comprobar y reclamar en un solo paso evita que
+# dos reintentos simultáneos creen dos trabajos.
+CLAIM_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    local owner = redis.call('GET', key)
+    if owner then
+        return owner
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, ARGV[1], 'EX', ARGV[i + 1])
+end
+return false
+"""
+
+# Liberar solo las claves que siguen siendo del trabajo (ARGV[1])
+RELEASE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+    end
+end
+return 1
+"""
+
+
+def call_fingerprint(phone_number, text):
+    """Huella de una llamada: mismo teléfono y mismo texto"""
+    return hashlib.sha256(f"{phone_number}\n{text}".encode('utf-8')).hexdigest()
+
+
+class EnqueueDeduplicator:
+    """
+    Reclamar en Redis las claves de un trabajo antes de encolarlo.
+
+    La Idempotency-Key del cliente se recuerda key_ttl segundos; la huella
+    (teléfono, texto) solo window segundos (0 la desactiva), así que la
+    misma llamada se puede repetir a propósito pasada la ventana. Un
+    duplicado recibe el job_id del trabajo original.
+    """
+
+    def __init__(self, redis_client, window=300, key_ttl=86400):
+        self.redis = redis_client
+        self.window = window
+        self.key_ttl = key_ttl
+        self.claim_script = redis_client.register_script(CLAIM_SCRIPT)
+        self.release_script = redis_client.register_script(RELEASE_SCRIPT)
+
+    def claim_keys(self, phone_number, text, idempotency_key=None):
+        """[(clave, ttl)]: primero la Idempotency-Key, que manda sobre la ventana"""
+        keys = []
+        if idempotency_key:
+            keys.append((f"{IDEMPOTENCY_KEY_PREFIX}{idempotency_key}", self.key_ttl))
+        if self.window > 0:
+            keys.append((f"{DEDUP_KEY_PREFIX}{call_fingerprint(phone_number, text)}", self.window))
+        return keys
+
+    def claim_many(self, jobs):
+        """
+        Reclamar las claves de varios trabajos en un solo pipeline.
+
+        jobs: [(job_data, idempotency_key)]. Devuelve, en el mismo orden, el
+        job_id original de cada duplicado o None si el trabajo es nuevo.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pending = []
+        for job_data, idempotency_key in jobs:
+            keys = self.claim_keys(job_data['phone_number'], job_data['text'], idempotency_key)
+            if keys:
+                self.claim_script(
+                    keys=[key for key, _ in keys],
+                    args=[job_data['job_id']] + [ttl for _, ttl in keys],
+                    client=pipe
+                )
+            pending.append(bool(keys))
+
+        results = iter(pipe.execute() if any(pending) else [])
+        owners = []
+        for claimed in pending:
+            owner = next(results) if claimed else None
+            owners.append(owner.decode() if owner else None)
+        return owners
+
+    def claim(self, job_data, idempotency_key=None):
+        return self.claim_many([(job_data, idempotency_key)])[0]
+
+    def release_many(self, jobs):
+        """Liberar las claves de trabajos que no llegaron a encolarse"""
+        pipe = self.redis.pipeline(transaction=False)
+        for job_data, idempotency_key in jobs:
+            keys = self.claim_keys(job_data['phone_number'], job_data['text'], idempotency_key)
+            if keys:
+                self.release_script(keys=[key for key, _ in keys], args=[job_data['job_id']], client=pipe)
+        try:
+            pipe.execute()
+        except Exception as e:
+            # Las claves vencen solas: como mucho se bloquea la ventana
+            logger.error(f"❌ Error liberando claves de duplicados: {e}")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Espera de cambios de estado de trabajos (long-poll) sobre el pub/sub de Redis
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobEventListener(threading.Thread):
+    """
+    Una sola suscripción a tts:events por proceso de la API.
+
+    Cada solicitud con ?wait= registra un threading.Event para su job_id y
+    duerme sobre él; este hilo lo despierta cuando el worker publica un
+    estado final. Así una espera no ocupa una conexión de Redis propia ni
+    genera consultas mientras tanto.
+    """
+
+    def __init__(self, redis_client, channel, statuses):
+        super().__init__(name='job-event-listener', daemon=True)
+        self.redis = redis_client
+        self.channel = channel
+        self.statuses = set(statuses)
+        self.waiters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def waiter(self, job_id):
+        """
+        Registrar una espera para job_id.
+
+        Se registra antes de leer el trabajo: un evento publicado entre la
+        lectura y la espera no se pierde.
+        """
+        event = threading.Event()
+        with self.lock:
+            self.waiters.setdefault(job_id, set()).add(event)
+        try:
+            yield event
+        finally:
+            with self.lock:
+                events = self.waiters.get(job_id)
+                if events is not None:
+                    events.discard(event)
+                    if not events:
+                        del self.waiters[job_id]
+
+    def notify(self, job_id):
+        with self.lock:
+            events = list(self.waiters.get(job_id, ()))
+        for event in events:
+            event.set()
+
+    def run(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                logger.info(f"👂 Escuchando cambios de trabajos en {self.channel}")
+
+                for message in pubsub.listen():
+                    if not self.waiters:
+                        continue
+                    data = json.loads(message['data'])
+                    if data.get('type') == 'job' and data.get('status') in self.statuses:
+                        self.notify(data['job_id'])
+
+            except Exception as e:
+                logger.error(f"❌ Error en suscripción de eventos: {e}")
+                time.sleep(1)
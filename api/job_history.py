@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Historial de trabajos a largo plazo en SQLite (modo WAL)
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    phone_number TEXT,
+    language TEXT,
+    priority TEXT,
+    text TEXT,
+    template_id TEXT,
+    worker_id TEXT,
+    audio_file TEXT,
+    error TEXT,
+    created_at REAL,
+    finished_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_phone_created ON jobs (phone_number, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+COLUMNS = (
+    'job_id', 'status', 'phone_number', 'language', 'priority', 'text', 'template_id',
+    'worker_id', 'audio_file', 'error', 'created_at', 'finished_at',
+)
+
+UPSERT = f"""
+INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)})
+VALUES ({', '.join('?' for _ in COLUMNS)})
+"""
+
+
+def to_timestamp(value):
+    """ISO 8601 (como en los registros de trabajo) o epoch -> epoch en segundos"""
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def to_isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class JobHistoryStore:
+    """
+    Tabla compacta de trabajos terminados, indexada por fecha, teléfono y estado.
+
+    WAL permite que la API consulte mientras el consumidor de resultados
+    escribe. Cada hilo usa su propia conexión (sqlite3 no comparte
+    conexiones entre hilos).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def row_for(job_data):
+        finished = job_data.get('completed_at') or job_data.get('failed_at')
+        values = dict(job_data)
+        values['created_at'] = to_timestamp(job_data.get('created_at'))
+        values['finished_at'] = to_timestamp(finished)
+        return tuple(values.get(column) for column in COLUMNS)
+
+    def save_many(self, jobs):
+        """Guardar un lote de trabajos en una sola transacción (el último estado gana)"""
+        with self.connection() as conn:
+            conn.executemany(UPSERT, [self.row_for(job_data) for job_data in jobs])
+
+    def get(self, job_id):
+        row = self.connection().execute(
+            'SELECT * FROM jobs WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        return self.as_job(row) if row else None
+
+    def query(self, phone_number=None, status=None, since=None, until=None, limit=100):
+        """
+        Trabajos más recientes primero.
+
+        until es exclusivo: para paginar se pasa el created_at del último
+        trabajo recibido.
+        """
+        conditions, params = [], []
+        if phone_number:
+            conditions.append('phone_number = ?')
+            params.append(phone_number)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(to_timestamp(since))
+        if until is not None:
+            conditions.append('created_at < ?')
+            params.append(to_timestamp(until))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.connection().execute(
+            f'SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?',
+            (*params, limit)
+        ).fetchall()
+        return [self.as_job(row) for row in rows]
+
+    @staticmethod
+    def as_job(row):
+        job = {key: row[key] for key in row.keys() if row[key] is not None}
+        job['created_at'] = to_isoformat(row['created_at'])
+        job['finished_at'] = to_isoformat(row['finished_at'])
+        return job
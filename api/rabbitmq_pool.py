@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Pool de canales RabbitMQ thread-safe para la API
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import logging
+
+import pika
+
+logger = logging.getLogger(__name__)
+
+# Errores que invalidan la conexión/canal y justifican reconectar
+CONNECTION_ERRORS = (pika.exceptions.AMQPError, OSError)
+
+
+class PooledChannel:
+    """Conexión bloqueante con su canal, usada por un solo hilo a la vez"""
+
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+        self.last_used = time.monotonic()
+        self.broken = False
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+class ChannelPool:
+    """
+    Pool de conexiones pika.BlockingConnection con préstamo exclusivo.
+
+    BlockingConnection no es thread-safe, así que cada hilo de Flask toma un
+    canal en préstamo (with pool.channel() as ch) y lo devuelve al terminar;
+    las publicaciones de distintos hilos van en paralelo por conexiones
+    distintas. Al prestar un canal se bombean sus eventos pendientes
+    (heartbeats) y se descartan los cerrados, rotos o inactivos demasiado
+    tiempo; las conexiones nuevas se abren con reintentos y backoff
+    exponencial, de modo que un reinicio del broker no tumba la API.
+    """
+
+    def __init__(self, url, max_size=10, transactional=False, max_idle=60,
+                 connect_attempts=5, backoff_base=0.5, backoff_max=8.0,
+                 checkout_timeout=10.0, on_connect=None):
+        self.parameters = pika.URLParameters(url)
+        self.max_size = max_size
+        self.transactional = transactional
+        self.max_idle = max_idle
+        self.connect_attempts = connect_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.checkout_timeout = checkout_timeout
+        self.on_connect = on_connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        """Abrir conexión y canal con reintentos y backoff exponencial"""
+        last_error = None
+        for attempt in range(self.connect_attempts):
+            try:
+                connection = pika.BlockingConnection(self.parameters)
+                channel = connection.channel()
+                if self.transactional:
+                    channel.tx_select()
+                if self.on_connect:
+                    self.on_connect(channel)
+                return PooledChannel(connection, channel)
+            except CONNECTION_ERRORS as e:
+                last_error = e
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                logger.warning(
+                    f"⚠️ Reconexión a RabbitMQ fallida (intento {attempt + 1}/"
+                    f"{self.connect_attempts}), reintentando en {delay:.1f}s: {e}"
+                )
+                time.sleep(delay)
+        raise ConnectionError(f"No se pudo conectar a RabbitMQ: {last_error}")
+
+    def _is_healthy(self, entry):
+        """Verificar un canal antes de prestarlo"""
+        if entry.broken or entry.connection.is_closed or entry.channel.is_closed:
+            return False
+        if time.monotonic() - entry.last_used > self.max_idle:
+            return False
+        try:
+            # Procesa heartbeats y detecta cierres del broker sin bloquear
+            entry.connection.process_data_events(time_limit=0)
+        except CONNECTION_ERRORS:
+            return False
+        return entry.channel.is_open
+
+    def _discard(self, entry):
+        entry.close()
+        self._slots.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(entry):
+                return entry
+            logger.info("♻️ Descartando canal RabbitMQ inactivo o cerrado")
+            self._discard(entry)
+
+        # No hay canales libres: abrir uno nuevo si quedan cupos
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError("Pool de canales RabbitMQ agotado")
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, entry):
+        if entry.broken or not self._is_usable(entry):
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        self._idle.put(entry)
+
+    @staticmethod
+    def _is_usable(entry):
+        return entry.connection.is_open and entry.channel.is_open
+
+    @contextmanager
+    def channel(self):
+        """Tomar un canal en préstamo exclusivo"""
+        entry = self._checkout()
+        try:
+            yield entry.channel
+        except CONNECTION_ERRORS:
+            entry.broken = True
+            raise
+        finally:
+            self._checkin(entry)
+
+    def publish(self, routing_key, body, properties=None, exchange=''):
+        """Publicar un mensaje reintentando una vez con un canal nuevo si el actual falla"""
+        for attempt in range(2):
+            try:
+                with self.channel() as channel:
+                    channel.basic_publish(
+                        exchange=exchange,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties
+                    )
+                return
+            except CONNECTION_ERRORS as e:
+                if attempt:
+                    raise
+                logger.warning(f"⚠️ Publicación fallida, reintentando con otro canal: {e}")
+
+    def close(self):
+        """Cerrar todas las conexiones libres"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Entrega de notificaciones HTTP (callback_url) de trabajos terminados
+"""
+
+import ipaddress
+import json
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Mueve a la lista de pendientes los reintentos cuyo turno ya llegó (y las
+# entregas en curso cuyo plazo venció). Es atómico, así que varios
+# notificadores pueden compartir las mismas claves.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(due) do
+    redis.call('ZREM', KEYS[1], item)
+    redis.call('RPUSH', KEYS[2], item)
+end
+return #due
+"""
+
+# Toma hasta ARGV[2] notificaciones pendientes y las deja en el zset de
+# entregas en curso con plazo ARGV[1]: si el notificador cae antes de
+# confirmarlas, PROMOTE_SCRIPT las devuelve a pendientes al vencer el plazo.
+CLAIM_SCRIPT = """
+local items = redis.call('LPOP', KEYS[1], ARGV[2])
+if not items then
+    return {}
+end
+for _, item in ipairs(items) do
+    redis.call('ZADD', KEYS[2], ARGV[1], item)
+end
+return items
+"""
+
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address)
+    return ip.is_global and not ip.is_multicast
+
+
+def host_allowed(host, allowed_hosts):
+    host = host.lower().rstrip('.')
+    return any(host == allowed or host.endswith(f'.{allowed}') for allowed in allowed_hosts)
+
+
+def callback_url_error(url, allowed_hosts=()):
+    """
+    Motivo por el que no se acepta una callback_url, o None.
+
+    Con allowed_hosts solo valen esos dominios (y sus subdominios); sin
+    lista se rechazan direcciones privadas, de loopback o link-local
+    (metadatos de la nube) y nombres internos sin dominio (redis,
+    rabbitmq). Los nombres se resuelven al entregar (resolves_public).
+    """
+    try:
+        parsed = urlsplit(url)
+        parsed.port  # puerto fuera de rango: ValueError
+    except ValueError:
+        return 'URL inválida'
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return 'debe ser una URL http(s)'
+    host = parsed.hostname
+    if allowed_hosts:
+        return None if host_allowed(host, allowed_hosts) else f'host {host} no permitido'
+    try:
+        public = is_public_address(host)
+    except ValueError:
+        if host == 'localhost' or host.endswith('.localhost') or '.' not in host.rstrip('.'):
+            return f'host interno {host} no permitido'
+        return None
+    return None if public else f'dirección {host} no permitida'
+
+
+def resolves_public(url):
+    """Todas las direcciones a las que resuelve el host de la URL son públicas"""
+    parsed = urlsplit(url)
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    return bool(addresses) and all(is_public_address(address.split('%')[0]) for address in addresses)
+
+
+class WebhookNotifier(threading.Thread):
+    """
+    Vacía por lotes la lista de notificaciones que encolan los workers.
+
+    Cada lote se toma con plazo (processing_key, `lease` segundos) y se
+    entrega en paralelo reutilizando conexiones HTTP; cada notificación se
+    confirma al terminar, así una caída a mitad de lote no pierde ninguna
+    (se reentregan al vencer el plazo). Las entregas fallidas (error de red
+    o respuesta que no es 2xx) se reprograman con backoff exponencial en un
+    zset hasta agotar max_attempts. Las URL cuyo host resuelve a una
+    dirección no pública se descartan (salvo con allowed_hosts).
+    """
+
+    def __init__(self, redis_client, queue_key, retry_key, processing_key, batch_size=50, concurrency=8,
+                 timeout=5.0, max_attempts=5, backoff_base=5.0, backoff_max=600.0, lease=300.0,
+                 allowed_hosts=(), poll_interval=0.5):
+        super().__init__(name='webhook-notifier', daemon=True)
+        self.redis = redis_client
+        self.queue_key = queue_key
+        self.retry_key = retry_key
+        self.processing_key = processing_key
+        self.lease = lease
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.promote = redis_client.register_script(PROMOTE_SCRIPT)
+        self.claim = redis_client.register_script(CLAIM_SCRIPT)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook')
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stop_event = threading.Event()
+
+    def next_batch(self):
+        """Tomar con plazo hasta batch_size notificaciones: [(item en Redis, notificación)]"""
+        items = self.claim(keys=[self.queue_key, self.processing_key],
+                           args=[time.time() + self.lease, self.batch_size])
+        return [(item, json.loads(item)) for item in items]
+
+    def deliver(self, notification):
+        """(error o None, se puede reintentar)"""
+        url = notification['callback_url']
+        try:
+            if not self.allowed_hosts and not resolves_public(url):
+                return 'host con dirección no pública', False
+            # Sin redirecciones: una URL pública podría redirigir a la red interna
+            response = self.session.post(url, json=notification['body'], timeout=self.timeout,
+                                         allow_redirects=False)
+            if 200 <= response.status_code < 300:
+                return None, False
+            return f"HTTP {response.status_code}", True
+        except (requests.RequestException, OSError) as e:
+            return str(e), True
+
+    def deliver_batch(self, batch):
+        results = list(self.executor.map(self.deliver, [notification for _, notification in batch]))
+
+        # Confirmación y reintento en la misma transacción
+        pipe = self.redis.pipeline()
+        delivered = 0
+        for (item, notification), (error, retry) in zip(batch, results):
+            pipe.zrem(self.processing_key, item)
+            if error is None:
+                delivered += 1
+                continue
+
+            notification['attempts'] += 1
+            job_id = notification['body'].get('job_id')
+            if not retry or notification['attempts'] >= self.max_attempts:
+                logger.error(
+                    f"❌ Notificación de {job_id} descartada tras "
+                    f"{notification['attempts']} intentos: {error}"
+                )
+                continue
+
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (notification['attempts'] - 1)))
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(f"⚠️ Notificación de {job_id} fallida ({error}), reintento en {delay:.0f}s")
+            pipe.zadd(self.retry_key, {json.dumps(notification): time.time() + delay})
+        pipe.execute()
+
+        if delivered:
+            logger.info(f"📨 {delivered}/{len(batch)} notificaciones entregadas")
+
+    def run(self):
+        logger.info("📨 Notificador de webhooks iniciado")
+        while not self.stop_event.is_set():
+            try:
+                now = time.time()
+                self.promote(keys=[self.processing_key, self.queue_key], args=[now, self.batch_size])
+                self.promote(keys=[self.retry_key, self.queue_key], args=[now, self.batch_size])
+                batch = self.next_batch()
+                if batch:
+                    self.deliver_batch(batch)
+                else:
+                    self.stop_event.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"❌ Error en notificador de webhooks: {e}")
+                time.sleep(1)
+
+    def stop(self):
+        self.stop_event.set()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de extremo a extremo con sustitutos locales
+
+Ejecuta en un solo proceso el código real de la API (tts_queue_api, con el
+cliente de pruebas de Flask) y de los workers (TTSWorker) contra RabbitMQ y
+Redis locales. La síntesis usa el motor falso (TTS_ENGINES=fake) con la
+latencia indicada y Asterisk se sustituye por FakeSpool, que archiva los
+.call en outgoing_done como si la llamada se hubiera contestado. Sonidos y
+spool van a un directorio temporal.
+
+Mide:
+- solicitudes/s al encolar por POST /tts/call
+- latencia de extremo a extremo (creación -> llamada terminada) y hasta la
+  marcación (creación -> dialing), en percentiles
+- espera por prioridad (creación -> un worker toma el trabajo)
+- comandos de Redis por trabajo (total_commands_processed de INFO; incluye
+  los heartbeats de los workers)
+
+Usar un vhost de RabbitMQ y una base de Redis dedicados: --purge vacía las
+colas del sistema antes de empezar y sin él la prueba no arranca si tienen
+mensajes.
+
+Uso:
+    python benchmarks/load_test.py --jobs 500 --workers 2 --purge
+    python benchmarks/load_test.py --jobs 500 --save-baseline
+    python benchmarks/load_test.py --jobs 500 --compare --tolerance 0.2
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCHMARKS_DIR, '..')
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+# Métrica -> (descripción, mayor es mejor, holgura absoluta)
+METRICS = {
+    'enqueue_rps': ('encolado (solicitudes/s)', True, 0.0),
+    'jobs_per_second': ('trabajos terminados/s', True, 0.0),
+    'e2e_p50': ('extremo a extremo p50 (s)', False, 0.05),
+    'e2e_p95': ('extremo a extremo p95 (s)', False, 0.05),
+    'e2e_p99': ('extremo a extremo p99 (s)', False, 0.05),
+    'dial_p95': ('hasta marcación p95 (s)', False, 0.05),
+    'wait_high_p95': ('espera prioritaria p95 (s)', False, 0.05),
+    'wait_normal_p95': ('espera normal p95 (s)', False, 0.05),
+    'redis_ops_per_job': ('comandos de Redis por trabajo', False, 1.0),
+}
+
+# Parámetros que deben coincidir para que la comparación tenga sentido
+RUN_PARAMETERS = ('jobs', 'clients', 'workers', 'high_ratio', 'tts_latency', 'call_duration',
+                  'channels', 'distinct_texts')
+
+
+def configure(args, workdir):
+    """Entorno de la API y los workers; tiene que fijarse antes de importarlos"""
+    dirs = {}
+    for name in ('sounds', 'outgoing', 'outgoing_done'):
+        dirs[name] = os.path.join(workdir, name)
+        os.makedirs(dirs[name])
+
+    os.environ.update({
+        'TTS_ENGINES': 'fake',
+        'TTS_FAKE_LATENCY': str(args.tts_latency),
+        'ASTERISK_SOUNDS_DIR': dirs['sounds'],
+        'ASTERISK_SPOOL_DIR': dirs['outgoing'],
+        'ASTERISK_DONE_DIR': dirs['outgoing_done'],
+        'ASTERISK_USER': getpass.getuser(),
+        'CALL_ORIGINATOR': 'spool',
+        'CALL_DONE_SCAN_INTERVAL': '0.1',
+        'TRUNK_MAX_CHANNELS': str(args.channels),
+        'TRUNK_MAX_CPS': '0',
+        'WORKER_METRICS_PORT': '0',
+        'WEBHOOK_NOTIFIER_ENABLED': 'false',
+        'JOB_HISTORY_DB': os.path.join(workdir, 'job_history.db'),
+    })
+    if args.concurrency:
+        os.environ['WORKER_CONCURRENCY'] = str(args.concurrency)
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'workers'))
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'api'))
+    return dirs
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def seconds(start, end):
+    if not start or not end:
+        return None
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+class TerminalWatcher(threading.Thread):
+    """Trabajos que llegan a un estado final, según los eventos de tts:events"""
+
+    def __init__(self, redis_client, channel, statuses):
+        super().__init__(name='bench-terminal-watcher', daemon=True)
+        self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+        self.statuses = set(statuses)
+        self.finished = set()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            message = self.pubsub.get_message(timeout=0.2)
+            if not message:
+                continue
+            data = json.loads(message['data'])
+            if data.get('type') == 'job' and data.get('status') in self.statuses:
+                self.finished.add(data['job_id'])
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        self.pubsub.close()
+
+
+def check_queues(channel, queues, purge):
+    """Vaciar las colas (--purge) o comprobar que están vacías"""
+    busy = {}
+    for queue in queues:
+        if purge:
+            channel.queue_purge(queue)
+        else:
+            depth = channel.queue_declare(queue=queue, durable=True, passive=True).method.message_count
+            if depth:
+                busy[queue] = depth
+    return busy
+
+
+def start_workers(tts_worker, count):
+    workers = []
+    for index in range(count):
+        worker = tts_worker.TTSWorker()
+        worker.worker_id = f'bench-{index}-{uuid.uuid4().hex[:6]}'
+        ready = threading.Event()
+
+        def run(worker=worker, ready=ready):
+            try:
+                worker.connect()
+            finally:
+                ready.set()
+            worker.start_consuming()
+
+        thread = threading.Thread(target=run, name=worker.worker_id, daemon=True)
+        thread.start()
+        ready.wait()
+        if worker.connection is None:
+            raise RuntimeError(f"El worker {worker.worker_id} no pudo conectarse")
+        workers.append((worker, thread))
+    return workers
+
+
+def stop_workers(workers):
+    for worker, _ in workers:
+        worker.is_running = False
+    for worker, thread in workers:
+        thread.join(timeout=5)
+        worker.stop()
+
+
+def enqueue(app, args):
+    """POST /tts/call desde args.clients hilos; devuelve (job_ids, latencias, segundos)"""
+    texts = [f'Mensaje de prueba de carga número {n}, por favor no responda.'
+             for n in range(args.distinct_texts)]
+
+    def send(index):
+        client = app.test_client()
+        started = time.monotonic()
+        response = client.post('/tts/call', json={
+            'text': texts[index % len(texts)],
+            # Un teléfono por trabajo: la ventana de duplicados no interviene
+            'phone_number': f'300{index:07d}',
+            # Prioritarios repartidos de forma uniforme a lo largo de la carga
+            'priority': 'high' if int((index + 1) * args.high_ratio) > int(index * args.high_ratio) else 'normal',
+        })
+        elapsed = time.monotonic() - started
+        body = response.get_json() or {}
+        if response.status_code != 202:
+            raise RuntimeError(f"POST /tts/call devolvió {response.status_code}: {body.get('error')}")
+        return body['job_id'], elapsed
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(send, range(args.jobs)))
+    total = time.monotonic() - started
+    return [job_id for job_id, _ in results], [elapsed for _, elapsed in results], total
+
+
+def load_jobs(redis_client, job_ids):
+    jobs = []
+    for start in range(0, len(job_ids), 500):
+        chunk = job_ids[start:start + 500]
+        for raw in redis_client.mget([f'job:{job_id}' for job_id in chunk]):
+            if raw:
+                jobs.append(json.loads(raw))
+    return jobs
+
+
+def summarize(jobs, enqueue_latencies, enqueue_seconds, redis_ops, args):
+    e2e, dial, waits, statuses = [], [], {'high': [], 'normal': []}, {}
+    first_created, last_finished = None, None
+    for job in jobs:
+        statuses[job['status']] = statuses.get(job['status'], 0) + 1
+        finished = job.get('completed_at') or job.get('failed_at')
+        if seconds(job['created_at'], finished) is not None:
+            e2e.append(seconds(job['created_at'], finished))
+            last_finished = max(last_finished or finished, finished)
+        first_created = min(first_created or job['created_at'], job['created_at'])
+        if job.get('dialing_at'):
+            dial.append(seconds(job['created_at'], job['dialing_at']))
+        if job.get('processed_at'):
+            waits[job.get('priority', 'normal')].append(seconds(job['created_at'], job['processed_at']))
+
+    span = seconds(first_created, last_finished) if e2e else None
+    return {
+        'enqueue_rps': args.jobs / enqueue_seconds,
+        'enqueue_p95': percentile(enqueue_latencies, 0.95),
+        'jobs_per_second': len(e2e) / span if span else 0.0,
+        'e2e_p50': percentile(e2e, 0.50),
+        'e2e_p95': percentile(e2e, 0.95),
+        'e2e_p99': percentile(e2e, 0.99),
+        'dial_p95': percentile(dial, 0.95),
+        'wait_high_p95': percentile(waits['high'], 0.95),
+        'wait_high_p50': percentile(waits['high'], 0.50),
+        'wait_normal_p95': percentile(waits['normal'], 0.95),
+        'wait_normal_p50': percentile(waits['normal'], 0.50),
+        'redis_ops_per_job': redis_ops / args.jobs,
+        'statuses': statuses,
+    }
+
+
+def report(results):
+    print(f"{'métrica':<36}{'valor':>12}")
+    print(f"{'encolado p95 (s)':<36}{results['enqueue_p95']:>12.4f}")
+    for name, (label, _, _) in METRICS.items():
+        print(f"{label:<36}{results[name]:>12.3f}")
+    print(f"{'espera prioritaria p50 (s)':<36}{results['wait_high_p50']:>12.3f}")
+    print(f"{'espera normal p50 (s)':<36}{results['wait_normal_p50']:>12.3f}")
+    print(f"estados: {results['statuses']}")
+
+
+def compare(results, baseline, tolerance):
+    """Imprimir la comparación y devolver las métricas que empeoraron"""
+    regressions = []
+    print()
+    print(f"{'métrica':<36}{'base':>12}{'actual':>12}{'cambio':>10}")
+    for name, (label, higher_is_better, slack) in METRICS.items():
+        base, current = baseline.get(name), results[name]
+        if base is None or base != base:
+            continue
+        change = (current - base) / base if base else 0.0
+        if higher_is_better:
+            worse = current < base * (1 - tolerance) - slack
+        else:
+            worse = current > base * (1 + tolerance) + slack
+        mark = '  ❌' if worse else ''
+        print(f"{label:<36}{base:>12.3f}{current:>12.3f}{change:>+10.1%}{mark}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=500, help='trabajos a encolar')
+    parser.add_argument('--clients', type=int, default=8, help='hilos que llaman a POST /tts/call')
+    parser.add_argument('--workers', type=int, default=2, help='instancias de TTSWorker')
+    parser.add_argument('--concurrency', type=int, default=0, help='WORKER_CONCURRENCY (default: el del worker)')
+    parser.add_argument('--high-ratio', type=float, default=0.2, help='fracción de trabajos prioritarios')
+    parser.add_argument('--tts-latency', type=float, default=0.05, help='segundos por síntesis del motor falso')
+    parser.add_argument('--call-duration', type=float, default=0.2, help='segundos de cada llamada simulada')
+    parser.add_argument('--channels', type=int, default=50, help='TRUNK_MAX_CHANNELS')
+    parser.add_argument('--distinct-texts', type=int, default=50, help='textos distintos (aciertos de cache)')
+    parser.add_argument('--timeout', type=float, default=300, help='segundos máximos esperando los trabajos')
+    parser.add_argument('--purge', action='store_true', help='vaciar las colas del sistema antes de empezar')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='archivo de referencia')
+    parser.add_argument('--save-baseline', action='store_true', help='guardar el resultado como referencia')
+    parser.add_argument('--compare', action='store_true', help='comparar con la referencia (sale con 1 si empeora)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='empeoramiento relativo admitido')
+    args = parser.parse_args()
+    if not 0 <= args.high_ratio <= 1:
+        parser.error('--high-ratio debe estar entre 0 y 1')
+
+    workdir = tempfile.mkdtemp(prefix='tts-load-')
+    dirs = configure(args, workdir)
+
+    import logging
+    import tts_queue_api
+    import tts_worker
+    from fake_spool import FakeSpool
+    from job_state import EVENTS_CHANNEL, TERMINAL_STATUSES
+    from pipeline import READY_QUEUES
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app = tts_queue_api.app
+    # Primera solicitud: abre las conexiones de la API y declara las colas
+    app.test_client().get('/health')
+    redis_client = tts_queue_api.redis_client
+
+    queues = ('tts_priority', 'tts_calls', 'tts_results', *READY_QUEUES)
+    with tts_queue_api.publisher_pool.channel() as channel:
+        busy = check_queues(channel, queues, args.purge)
+    if busy:
+        print(f"❌ Colas con mensajes: {busy}. Usar --purge en un entorno dedicado.")
+        return 2
+
+    spool = FakeSpool(dirs['outgoing'], dirs['outgoing_done'], call_duration=args.call_duration)
+    spool.start()
+    watcher = TerminalWatcher(redis_client, EVENTS_CHANNEL, TERMINAL_STATUSES)
+    watcher.start()
+    workers = start_workers(tts_worker, args.workers)
+
+    print(f"🧪 {args.jobs} trabajos, {args.clients} clientes, {args.workers} workers, "
+          f"síntesis {args.tts_latency}s, llamada {args.call_duration}s ({workdir})")
+
+    commands_before = redis_client.info('stats')['total_commands_processed']
+    try:
+        job_ids, enqueue_latencies, enqueue_seconds = enqueue(app, args)
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline and not watcher.finished.issuperset(job_ids):
+            time.sleep(0.1)
+        commands_after = redis_client.info('stats')['total_commands_processed']
+    finally:
+        stop_workers(workers)
+        watcher.stop()
+        spool.stop_event.set()
+
+    missing = len(set(job_ids) - watcher.finished)
+    if missing:
+        print(f"⚠️ {missing} trabajos sin terminar tras {args.timeout}s")
+
+    results = summarize(
+        load_jobs(redis_client, job_ids), enqueue_latencies, enqueue_seconds,
+        commands_after - commands_before, args
+    )
+    report(results)
+
+    parameters = {name: getattr(args, name) for name in RUN_PARAMETERS}
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': parameters, 'results': results}, f, indent=2)
+        print(f"💾 Referencia guardada en {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('parameters') != parameters:
+            print(f"⚠️ Parámetros distintos a los de la referencia: {baseline.get('parameters')}")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"❌ Empeoran: {', '.join(regressions)}")
+            return 1
+        print("✅ Sin regresiones respecto a la referencia")
+
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
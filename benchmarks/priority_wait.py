@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark de espera en cola por prioridad bajo carga mixta
+
+Simula un worker con N huecos que atiende tts_priority y tts_calls con una
+cola normal profunda, y compara:
+
+- consume:  dos basic_consume en un canal (comportamiento anterior); RabbitMQ
+            reparte round-robin entre consumidores dentro del prefetch.
+- weighted: PriorityScheduler del worker (basic_get solo con hueco libre).
+
+La simulación es de eventos discretos y usa el PriorityScheduler real, así
+que mide la política del worker sin depender de la red ni de gTTS.
+
+Uso:
+    python benchmarks/priority_wait.py
+    python benchmarks/priority_wait.py --high-rate 1.5 --burst 5 --backlog 10000
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'workers'))
+
+from scheduler import PriorityScheduler  # noqa: E402
+
+HIGH, NORMAL = 'tts_priority', 'tts_calls'
+
+
+class Method:
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+
+
+class SimulatedChannel:
+    """Colas en memoria con la interfaz basic_get de pika"""
+
+    def __init__(self):
+        self.queues = {HIGH: deque(), NORMAL: deque()}
+        self.tag = 0
+
+    def publish(self, queue, arrived_at):
+        self.queues[queue].append(arrived_at)
+
+    def basic_get(self, queue):
+        if not self.queues[queue]:
+            return None, None, None
+        self.tag += 1
+        return Method(self.tag), None, self.queues[queue].popleft()
+
+
+class RoundRobinConsumers:
+    """
+    Modelo de dos consumidores en un canal: el broker entrega alternando entre
+    colas con mensajes mientras queden mensajes sin confirmar por debajo del
+    prefetch; el worker los atiende en orden de llegada.
+    """
+
+    def __init__(self, channel, prefetch):
+        self.channel = channel
+        self.prefetch = prefetch
+        self.buffer = deque()
+        self.turn = 0
+        self.unacked = 0
+
+    def fill(self):
+        order = [HIGH, NORMAL]
+        while self.unacked < self.prefetch:
+            for offset in range(2):
+                queue = order[(self.turn + offset) % 2]
+                method, _, arrived_at = self.channel.basic_get(queue)
+                if method is not None:
+                    self.turn = (self.turn + offset + 1) % 2
+                    self.buffer.append((queue, arrived_at))
+                    self.unacked += 1
+                    break
+            else:
+                return
+
+    def next_message(self):
+        self.fill()
+        return self.buffer.popleft() if self.buffer else (None, None)
+
+    def ack(self):
+        self.unacked -= 1
+
+
+class WeightedConsumer:
+    def __init__(self, channel, burst):
+        self.channel = channel
+        self.scheduler = PriorityScheduler(HIGH, NORMAL, burst=burst)
+
+    def next_message(self):
+        queue, method, _, arrived_at = self.scheduler.next_message(self.channel)
+        return (queue, arrived_at) if method is not None else (None, None)
+
+    def ack(self):
+        pass
+
+
+def simulate(mode, args):
+    rng = random.Random(args.seed)
+    channel = SimulatedChannel()
+    for _ in range(args.backlog):
+        channel.publish(NORMAL, 0.0)
+
+    if mode == 'consume':
+        consumer = RoundRobinConsumers(channel, args.prefetch or args.concurrency)
+    else:
+        consumer = WeightedConsumer(channel, args.burst)
+
+    # Eventos: (tiempo, orden, tipo, cola)
+    events = []
+    sequence = 0
+    for queue, rate in ((HIGH, args.high_rate), (NORMAL, args.normal_rate)):
+        if rate > 0:
+            heapq.heappush(events, (rng.expovariate(rate), sequence, 'arrival', queue))
+            sequence += 1
+
+    waits = {HIGH: [], NORMAL: []}
+    idle = args.concurrency
+
+    while events:
+        now, _, kind, queue = heapq.heappop(events)
+        if now > args.duration:
+            break
+
+        if kind == 'arrival':
+            channel.publish(queue, now)
+            rate = args.high_rate if queue == HIGH else args.normal_rate
+            heapq.heappush(events, (now + rng.expovariate(rate), sequence, 'arrival', queue))
+            sequence += 1
+        else:
+            idle += 1
+            consumer.ack()
+
+        while idle:
+            served, arrived_at = consumer.next_message()
+            if served is None:
+                break
+            idle -= 1
+            waits[served].append(now - arrived_at)
+            service = rng.expovariate(1 / args.service_time)
+            heapq.heappush(events, (now + service, sequence, 'done', served))
+            sequence += 1
+
+    return waits, {queue: len(pending) for queue, pending in channel.queues.items()}
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=4, help='huecos del worker (WORKER_CONCURRENCY)')
+    parser.add_argument('--prefetch', type=int, default=0, help='prefetch del modo consume (default: concurrency)')
+    parser.add_argument('--service-time', type=float, default=2.0, help='segundos medios por trabajo')
+    parser.add_argument('--high-rate', type=float, default=1.2, help='llegadas prioritarias por segundo')
+    parser.add_argument('--normal-rate', type=float, default=1.0, help='llegadas normales por segundo')
+    parser.add_argument('--backlog', type=int, default=2000, help='trabajos normales ya en cola al empezar')
+    parser.add_argument('--burst', type=int, default=10, help='WORKER_PRIORITY_BURST')
+    parser.add_argument('--duration', type=float, default=1800, help='segundos simulados')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    capacity = args.concurrency / args.service_time
+    print(f"Capacidad: {capacity:.2f} trabajos/s | llegadas: {args.high_rate} prioritarias/s, "
+          f"{args.normal_rate} normales/s | backlog normal inicial: {args.backlog}")
+    print()
+    print(f"{'modo':<10}{'cola':<14}{'atendidos':>10}{'p50 (s)':>10}{'p95 (s)':>10}"
+          f"{'p99 (s)':>10}{'max (s)':>10}{'pendientes':>12}")
+
+    for mode in ('consume', 'weighted'):
+        waits, pending = simulate(mode, args)
+        for queue in (HIGH, NORMAL):
+            values = waits[queue]
+            print(f"{mode:<10}{queue:<14}{len(values):>10}"
+                  f"{percentile(values, 0.50):>10.1f}{percentile(values, 0.95):>10.1f}"
+                  f"{percentile(values, 0.99):>10.1f}{max(values, default=float('nan')):>10.1f}"
+                  f"{pending[queue]:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,7 @@ show_help() {
     echo "  status        - Ver estado de todos los servicios"
     echo "  logs          - Ver logs de todos los servicios"
     echo "  scale [N]     - Escalar workers a N instancias"
+    echo "  autoscale     - Autoescalar el servicio tts-worker según las colas"
     echo "  api-only      - Solo iniciar API y dependencias"
     echo "  workers-only  - Solo iniciar workers"
     echo "  dashboard     - Solo iniciar dashboard"
@@ -120,6 +121,7 @@ EOF
       - ./logs:/app/logs
       - /var/lib/asterisk/sounds:/var/lib/asterisk/sounds
       - /var/spool/asterisk/outgoing:/var/spool/asterisk/outgoing
+      - /var/spool/asterisk/outgoing_done:/var/spool/asterisk/outgoing_done
 
 EOF
     done
@@ -131,6 +133,14 @@ EOF
     rm -f docker-compose.override.yml
 }
 
+# Función para autoescalar workers
+autoscale_workers() {
+    echo "⚖️ Iniciando autoescalado del servicio tts-worker (Ctrl+C para salir)..."
+    echo "   Límites: curl -X POST http://localhost:5000/workers/scale -H 'Content-Type: application/json' -d '{\"min_workers\": 1, \"max_workers\": 10}'"
+    AUTOSCALE_ACTUATOR=compose AUTOSCALE_COMPOSE_COMMAND="${AUTOSCALE_COMPOSE_COMMAND:-docker-compose}" \
+        python3 api/autoscaler.py
+}
+
 # Función para configurar Asterisk
 setup_asterisk() {
     echo "⚙️ Configurando Asterisk para sistema de colas..."
@@ -219,6 +229,9 @@ case "$1" in
     scale)
         scale_workers $2
         ;;
+    autoscale)
+        autoscale_workers
+        ;;
     api-only)
         docker-compose up -d rabbitmq redis tts-api
         ;;
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Cada servicio importa sus módulos por nombre desde su propio directorio
+for service in ('api', 'workers'):
+    sys.path.insert(0, os.path.join(ROOT_DIR, service))
@@ -0,0 +1,140 @@
+"""
+Autoescalado con workers fijos, entradas viejas en el registro, roles por
+etapa y troncal saturado
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip('pika')
+pytest.importorskip('redis')
+
+import autoscaler  # noqa: E402
+
+
+class FakePipeline:
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self.results = []
+
+    def hmget(self, key, *fields):
+        self.results.append([self.hashes.get(key, {}).get(field) for field in fields])
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+class FakeRedis:
+    """Registro de workers (zset por último heartbeat) y sus hashes"""
+
+    def __init__(self, heartbeats, processed, roles=None):
+        self.heartbeats = heartbeats
+        self.hashes = {f'worker:{worker_id}': {'processed_jobs': str(count)}
+                       for worker_id, count in processed.items()}
+        for worker_id, role in (roles or {}).items():
+            self.hashes[f'worker:{worker_id}']['role'] = role.encode()
+
+    def zrangebyscore(self, key, low, high):
+        return [worker_id.encode() for worker_id, at in self.heartbeats.items() if at >= low]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self.hashes)
+
+
+def observer_for(heartbeats, processed, roles=None):
+    observer = autoscaler.QueueObserver(
+        FakeRedis(heartbeats, processed, roles),
+        owns=autoscaler.ProcessActuator('true').owns,
+        stale_after=90
+    )
+    observer.queue_counts = lambda: {queue: (0, 0) for queue in autoscaler.SYNTH_QUEUES + autoscaler.READY_QUEUES}
+    return observer
+
+
+def test_observer_counts_managed_workers_and_skips_stale_ones():
+    now = time.time()
+    observer = observer_for(
+        {'worker-1': now, 'worker-2': now, 'worker-local-1': now, 'worker-local-2': now - 200},
+        {'worker-1': 3, 'worker-2': 4, 'worker-local-1': 5, 'worker-local-2': 6}
+    )
+
+    sample = observer.observe()
+
+    assert sample.workers == 3
+    assert sample.managed == 1
+    assert sample.processed == {'worker-1': 3, 'worker-2': 4, 'worker-local-1': 5}
+
+
+def test_desired_discounts_fixed_workers():
+    policy = autoscaler.ScalingPolicy(drain_seconds=100, worker_rate=1.0)
+    # 5 trabajos/s de backlog a vaciar: 5 workers, 3 de ellos fijos
+    sample = autoscaler.Sample(at=0, backlog=500, ready=0, consumers=0, workers=4, processed={}, managed=1)
+
+    assert policy.desired(sample, minimum=0, maximum=10) == 2
+    assert policy.desired(sample, minimum=3, maximum=10) == 3
+
+
+def test_fixed_workers_alone_keep_managed_workers_at_minimum():
+    policy = autoscaler.ScalingPolicy(drain_seconds=100, worker_rate=1.0)
+    sample = autoscaler.Sample(at=0, backlog=200, ready=0, consumers=0, workers=3, processed={}, managed=0)
+
+    desired = policy.desired(sample, minimum=0, maximum=10)
+
+    assert desired == 0
+    assert policy.decide(current=0, desired=desired, minimum=0, maximum=10, now=0) == (0, 'estable')
+
+
+def test_observer_counts_workers_per_stage():
+    now = time.time()
+    observer = observer_for(
+        {'worker-1': now, 'worker-2': now, 'worker-local-1': now},
+        {'worker-1': 0, 'worker-2': 0, 'worker-local-1': 0},
+        {'worker-1': 'synth', 'worker-2': 'dial', 'worker-local-1': 'all'}
+    )
+
+    sample = observer.observe()
+
+    assert sample.stage_workers == {'synth': 2, 'dial': 2}
+    assert sample.fixed == {'synth': 1, 'dial': 1}
+
+
+def stage_sample(at, backlog, ready, synthesized, processed, workers=2):
+    return autoscaler.Sample(
+        at=at, backlog=backlog, ready=ready, consumers=0, workers=workers, processed=processed,
+        managed=workers, synthesized=synthesized
+    )
+
+
+def test_rates_are_learned_per_stage():
+    policy = autoscaler.ScalingPolicy(drain_seconds=100, worker_rate=1.0)
+    policy.update(stage_sample(0, 100, 50, {'w1': 0, 'w2': 0}, {'w1': 0, 'w2': 0}))
+    # 10 s: 20 sintetizados y 4 marcados entre 2 workers
+    policy.update(stage_sample(10, 100, 50, {'w1': 10, 'w2': 10}, {'w1': 2, 'w2': 2}))
+
+    assert policy.rates['synth'] == pytest.approx(1.0)
+    assert policy.rates['dial'] == pytest.approx(0.6)
+
+
+def test_trunk_bound_dialing_does_not_scale_to_max():
+    # 10 canales, 50 s por llamada: el troncal marca como mucho 0.2 llamadas/s
+    policy = autoscaler.ScalingPolicy(drain_seconds=100, worker_rate=0.1, trunk_channels=10,
+                                      trunk_cps=1.0, call_seconds=50)
+    synthesized = {'w1': 0, 'w2': 0, 'w3': 0, 'w4': 0}
+    processed = dict(synthesized)
+    for at in range(0, 600, 15):
+        # Audio de sobra en tts_ready; cada worker marca 0.05/s esperando canal
+        sample = stage_sample(at, 1000, 1000, synthesized, dict(processed), workers=4)
+        policy.update(sample)
+        processed = {worker_id: count + 0.75 for worker_id, count in processed.items()}
+
+    assert policy.rates['dial'] == pytest.approx(0.1)
+    # Dos workers a 0.1/s ya saturan el troncal
+    assert policy.desired(sample, minimum=0, maximum=20) == 2
+
+
+def test_unlimited_trunk_does_not_cap():
+    assert autoscaler.trunk_capacity(0, 1.0, 60) == float('inf')
+    assert autoscaler.trunk_capacity(30, 1.0, 60) == pytest.approx(0.5)
+    assert autoscaler.trunk_capacity(120, 1.0, 60) == pytest.approx(1.0)
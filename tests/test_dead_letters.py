@@ -0,0 +1,142 @@
+"""
+Reenvío de una cola tts_dead con trabajos y mensajes de plantillas mezclados
+"""
+
+import json
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip('pika')
+
+import dead_letters  # noqa: E402
+
+
+class Method:
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+
+
+class Properties:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeChannel:
+    """Canal transaccional en memoria: basic_get sobre tts_dead y publicaciones"""
+
+    def __init__(self, messages):
+        self.dead = [(tag, json.dumps(body), headers) for tag, (body, headers) in enumerate(messages, 1)]
+        self.published = []
+        self.acked = []
+        self.committed = False
+
+    def basic_get(self, queue, auto_ack=False):
+        if not self.dead:
+            return None, None, None
+        tag, body, headers = self.dead.pop(0)
+        return Method(tag), Properties(headers), body
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, json.loads(body)))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue=True, multiple=False):
+        pass
+
+    def tx_commit(self):
+        self.committed = True
+
+
+JOB = {
+    'job_id': 'job-1',
+    'text': 'Hola',
+    'phone_number': '3005050149',
+    'priority': 'normal',
+    'created_at': '2024-01-01T00:00:00',
+    'status': 'failed',
+    'attempts': 5,
+    'error': 'timeout',
+}
+TEMPLATE = {'type': 'template_prerender', 'template_id': 'tpl-1'}
+
+
+def mixed_channel():
+    return FakeChannel([
+        (JOB, {'x-source-queue': 'tts_calls'}),
+        (TEMPLATE, {'x-source-queue': 'tts_templates'}),
+    ])
+
+
+def test_is_job():
+    assert dead_letters.is_job(JOB)
+    assert not dead_letters.is_job(TEMPLATE)
+    assert not dead_letters.is_job({'type': 'template_prerender', 'job_id': 'x'})
+
+
+def test_replay_requeues_every_message_to_its_source():
+    channel = mixed_channel()
+
+    replayed = dead_letters.replay(channel, limit=10)
+
+    assert channel.committed
+    assert channel.acked == [1, 2]
+    assert [queue for queue, _ in channel.published] == ['tts_calls', 'tts_templates']
+    assert 'attempts' not in channel.published[0][1]
+    assert [dead_letters.is_job(message) for _, message in replayed] == [True, False]
+
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+        self.results = []
+
+    def get(self, key):
+        self.results.append(self.store.get(key))
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+        self.results.append(True)
+
+    def __getattr__(self, name):
+        # hincrby, zadd, publish, zremrangebyscore: solo se cuentan
+        return lambda *args, **kwargs: self.results.append(None)
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {'job:job-1': json.dumps(JOB)}
+
+    def pipeline(self):
+        return FakePipeline(self.store)
+
+
+def test_queue_manager_replays_mixed_dead_queue():
+    pytest.importorskip('flask')
+    pytest.importorskip('redis')
+    pytest.importorskip('prometheus_client')
+    pytest.importorskip('requests')
+    import tts_queue_api
+
+    channel = mixed_channel()
+
+    class Pool:
+        @contextmanager
+        def channel(self):
+            yield channel
+
+    manager = tts_queue_api.TTSQueueManager.__new__(tts_queue_api.TTSQueueManager)
+    manager.batch_pool = Pool()
+    manager.redis = FakeRedis()
+
+    job_ids, others = manager.replay_dead_jobs(limit=10)
+
+    assert job_ids == ['job-1']
+    assert others == [{'type': 'template_prerender', 'template_id': 'tpl-1', 'queue': 'tts_templates'}]
+    assert json.loads(manager.redis.store['job:job-1'])['status'] == 'queued'
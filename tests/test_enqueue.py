@@ -0,0 +1,88 @@
+"""
+Un fallo al encolar después de reclamar la Idempotency-Key no deja la clave
+tomada por un trabajo que nunca llegó a la cola
+"""
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+pytest.importorskip('flask')
+pytest.importorskip('pika')
+pytest.importorskip('prometheus_client')
+pytest.importorskip('requests')
+
+import tts_queue_api  # noqa: E402
+from enqueue_dedup import EnqueueDeduplicator  # noqa: E402
+
+
+class FakePublisher:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.published = []
+
+    def publish(self, queue, body, properties=None):
+        if self.fail:
+            raise ConnectionError('RabbitMQ no disponible')
+        self.published.append((queue, body))
+
+
+@pytest.fixture
+def redis_conn():
+    return fakeredis.FakeRedis()
+
+
+def make_manager(redis_conn, publisher):
+    manager = tts_queue_api.TTSQueueManager.__new__(tts_queue_api.TTSQueueManager)
+    manager.redis = redis_conn
+    manager.publisher_pool = publisher
+    manager.dedup = EnqueueDeduplicator(redis_conn, window=300, key_ttl=3600)
+    return manager
+
+
+def enqueue(manager):
+    return manager.enqueue_tts_call('Hola', '3005050149', idempotency_key='pedido-1')
+
+
+def assert_nothing_queued(redis_conn):
+    assert not redis_conn.keys('job:*')
+    assert redis_conn.zcard(tts_queue_api.status_key('queued')) == 0
+    assert redis_conn.zcard(tts_queue_api.RECENT_JOBS_KEY) == 0
+    assert not redis_conn.keys('idem:*')
+
+
+def test_failed_record_releases_the_claim(redis_conn, monkeypatch):
+    def lost_reply(pipe):
+        # Redis aplicó el pipeline pero la respuesta no llegó
+        pipe.execute()
+        raise ConnectionError('Timeout leyendo de Redis')
+
+    monkeypatch.setattr(tts_queue_api, 'queue_recent_trim', lost_reply)
+    publisher = FakePublisher()
+    manager = make_manager(redis_conn, publisher)
+
+    with pytest.raises(ConnectionError):
+        enqueue(manager)
+
+    assert_nothing_queued(redis_conn)
+    assert publisher.published == []
+
+    # El reintento del cliente crea el trabajo
+    monkeypatch.undo()
+    job_data, duplicate = enqueue(manager)
+    assert not duplicate
+    assert len(publisher.published) == 1
+
+
+def test_failed_publish_releases_the_claim_and_the_record(redis_conn):
+    manager = make_manager(redis_conn, FakePublisher(fail=True))
+
+    with pytest.raises(ConnectionError):
+        enqueue(manager)
+
+    assert_nothing_queued(redis_conn)
+
+    manager.publisher_pool = FakePublisher()
+    job_data, duplicate = enqueue(manager)
+    assert not duplicate
+    assert redis_conn.exists(f"job:{job_data['job_id']}")
@@ -0,0 +1,161 @@
+"""
+Originación por AMIOriginator contra el servidor AMI de pruebas
+"""
+
+import threading
+import time
+
+import pytest
+
+# call_origination importa audio_pipeline (gTTS y pydub)
+pytest.importorskip('gtts')
+pytest.importorskip('pydub')
+
+from call_origination import (  # noqa: E402
+    CALL_CONTEXT, CALL_EXTENSION, AMIOriginator, CallRejected,
+)
+from ami_client import AMIError  # noqa: E402
+from fake_ami import FakeAMIServer  # noqa: E402
+
+TIMEOUT = 5
+
+
+class Calls:
+    """Callbacks on_answer/on_done del originador, con espera hasta el final"""
+
+    def __init__(self):
+        self.answered = []
+        self.done = []
+        self.finished = threading.Event()
+
+    def on_answer(self, job_id, at):
+        self.answered.append(job_id)
+
+    def on_done(self, job_id, fields, variables):
+        self.done.append((job_id, fields, variables))
+        self.finished.set()
+
+
+@pytest.fixture
+def ami():
+    servers = []
+
+    def start(originator_options=None, **kwargs):
+        kwargs = {'answer_delay': 0.01, 'call_duration': 0.01, **kwargs}
+        server = FakeAMIServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        calls = Calls()
+        options = {'pool_size': 1, 'timeout': 1.0, 'wait_time': 20, **(originator_options or {})}
+        originator = AMIOriginator(
+            '127.0.0.1', server.port, 'tts', 'tts', 'trunk',
+            on_done=calls.on_done, on_answer=calls.on_answer, **options
+        )
+        originator.start()
+        servers.append((server, originator))
+        return server, originator, calls
+
+    yield start
+
+    for server, originator in servers:
+        originator.stop()
+        server.shutdown()
+        server.server_close()
+
+
+def test_answered_call_reports_answer_and_hangup(ami):
+    server, originator, calls = ami(outcome='answered')
+
+    fields = originator.originate('3005050149', 'tts_abc', 'job-1')
+
+    assert fields['call_backend'] == 'ami'
+    assert calls.finished.wait(TIMEOUT)
+    [message] = server.originated
+    assert message['Channel'] == 'SIP/trunk/3005050149'
+    assert message['Context'] == CALL_CONTEXT
+    assert message['Exten'] == CALL_EXTENSION
+    assert message['Timeout'] == '20000'
+    assert message['Async'] == 'true'
+    assert message['ActionID'] == fields['call_action_id']
+
+    assert calls.answered == ['job-1']
+    [(job_id, done, variables)] = calls.done
+    assert job_id == 'job-1'
+    assert done['Status'] == 'Completed'
+    assert done['Cause'] == '16'
+    assert originator.outcome(done) == 'answered'
+    assert variables == {'AUDIO_FILE': 'tts_abc', 'JOB_ID': 'job-1', 'PHONE_NUMBER': '3005050149'}
+    assert not originator.dialing and not originator.active
+
+
+def test_busy_call_finishes_without_answer(ami):
+    server, originator, calls = ami(outcome='busy')
+
+    originator.originate('3005050149', 'tts_abc', 'job-2')
+
+    assert calls.finished.wait(TIMEOUT)
+    assert calls.answered == []
+    [(job_id, done, _)] = calls.done
+    assert job_id == 'job-2'
+    assert done['Status'] == 'Failed'
+    assert originator.outcome(done) == 'busy'
+    assert not originator.dialing
+
+
+def test_rejected_originate_raises(ami):
+    server, originator, calls = ami(reject=['000'])
+
+    with pytest.raises(CallRejected):
+        originator.originate('000', 'tts_abc', 'job-3')
+
+    assert server.originated == []
+    assert not originator.dialing
+
+
+def test_unanswered_originate_raises_and_forgets_the_call(ami):
+    server, originator, calls = ami(unresponsive=['3005050149'])
+
+    with pytest.raises(AMIError):
+        originator.originate('3005050149', 'tts_abc', 'job-4')
+
+    assert not originator.dialing
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_event_session_is_reopened_and_lost_hangup_expires(ami):
+    server, originator, calls = ami(
+        originator_options={'keepalive': 0.05, 'event_grace': 0.2}, call_duration=1.0
+    )
+
+    originator.originate('3005050149', 'tts_abc', 'job-5')
+    wait_for(lambda: calls.answered == ['job-5'])
+    # La sesión cae antes del Hangup: el evento se pierde
+    server.drop_event_sessions()
+
+    wait_for(lambda: server.subscribers)
+    assert calls.finished.wait(TIMEOUT)
+    [(job_id, done, _)] = calls.done
+    assert job_id == 'job-5'
+    assert done['Status'] == 'Completed'
+    assert originator.outcome(done) == 'answered'
+    assert not originator.active and not originator.hangup_deadlines
+
+
+def test_dialing_call_without_originate_response_fails(ami):
+    server, originator, calls = ami(
+        originator_options={'keepalive': 0.05, 'event_grace': 0.1, 'wait_time': 0.1}, answer_delay=2.0
+    )
+
+    originator.originate('3005050149', 'tts_abc', 'job-6')
+
+    assert calls.finished.wait(TIMEOUT)
+    assert calls.answered == []
+    [(job_id, done, _)] = calls.done
+    assert job_id == 'job-6'
+    assert originator.outcome(done) == 'failed'
+    assert not originator.dialing
@@ -0,0 +1,63 @@
+"""
+Solo los errores de datos marcados como permanentes van directo a tts_dead
+"""
+
+import json
+
+import pytest
+
+from job_retry import DEAD_QUEUE, PermanentJobError, RetryPolicy, decode_job
+
+
+def job(**fields):
+    return json.dumps({'job_id': 'job-1', 'text': 'Hola', 'phone_number': '3005050149', **fields})
+
+
+@pytest.mark.parametrize('error', [ValueError('decodificación'), KeyError('campo'), TypeError('bug')])
+def test_unclassified_errors_are_retried(error):
+    target, body, _, delay = RetryPolicy(base_delay=5).route('tts_calls', job(), error)
+
+    assert target == 'tts_calls.retry.5s'
+    assert delay == 5
+    assert json.loads(body)['attempts'] == 1
+
+
+def test_permanent_errors_go_to_dead_queue():
+    error = PermanentJobError('Plantilla t-1 no encontrada')
+
+    target, _, headers, delay = RetryPolicy().route('tts_calls', job(), error)
+
+    assert (target, delay) == (DEAD_QUEUE, None)
+    assert headers['x-error-type'] == 'permanent'
+
+
+def test_exhausted_retries_go_to_dead_queue():
+    target, _, headers, _ = RetryPolicy(max_attempts=3).route('tts_calls', job(attempts=2), ValueError())
+
+    assert target == DEAD_QUEUE
+    assert headers['x-error-type'] == 'exhausted'
+
+
+@pytest.mark.parametrize('body', [
+    b'no es json',
+    b'["job-1"]',
+    json.dumps({'text': 'Hola'}),
+    json.dumps({'job_id': 'job-1', 'text': ''}),
+    json.dumps({'job_id': 7, 'text': 'Hola'}),
+])
+def test_invalid_payloads_are_permanent(body):
+    with pytest.raises(PermanentJobError):
+        decode_job(body, ('job_id', 'text'))
+
+
+def test_valid_payload_is_decoded():
+    assert decode_job(job(), ('job_id', 'text'))['phone_number'] == '3005050149'
+
+
+def test_unsupported_gtts_language_is_permanent():
+    pytest.importorskip('gtts')
+    pytest.importorskip('pydub')
+    from audio_pipeline import synthesize_mp3
+
+    with pytest.raises(PermanentJobError):
+        synthesize_mp3('Hola', language='xx-no-existe')
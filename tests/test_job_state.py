@@ -0,0 +1,87 @@
+"""
+Contadores de estado con registros de trabajo que expiran a mitad de camino
+"""
+
+import json
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+from job_state import (  # noqa: E402
+    ACTIVE_STATUSES, JOB_STATS_KEY, TRANSITION_SCRIPT, status_key, transition_args, transition_keys,
+)
+
+
+@pytest.fixture
+def redis_conn():
+    return fakeredis.FakeRedis()
+
+
+def transition(redis_conn, job_id, status, expected=''):
+    job_data = {'job_id': job_id, 'status': status, 'text': 'Hola', 'phone_number': '3005050149'}
+    script = redis_conn.register_script(TRANSITION_SCRIPT)
+    return script(keys=transition_keys(job_id), args=transition_args(job_data, expected=expected))
+
+
+def active_counts(redis_conn):
+    return {status: redis_conn.zcard(status_key(status)) for status in ACTIVE_STATUSES}
+
+
+def terminal_counts(redis_conn):
+    return {k.decode(): int(v) for k, v in redis_conn.hgetall(JOB_STATS_KEY).items()}
+
+
+def test_job_moves_between_status_sets(redis_conn):
+    transition(redis_conn, 'job-1', 'processing')
+    transition(redis_conn, 'job-1', 'dialing')
+
+    assert active_counts(redis_conn)['processing'] == 0
+    assert active_counts(redis_conn)['dialing'] == 1
+
+    transition(redis_conn, 'job-1', 'answered')
+
+    assert sum(active_counts(redis_conn).values()) == 0
+    assert terminal_counts(redis_conn) == {'answered': 1}
+
+
+def test_expired_record_leaves_no_phantom_counts(redis_conn):
+    transition(redis_conn, 'job-1', 'processing')
+    # JOB_TTL vencido con el trabajo en curso: el estado anterior ya no se puede leer
+    redis_conn.delete('job:job-1')
+
+    transition(redis_conn, 'job-1', 'dialing')
+    redis_conn.delete('job:job-1')
+    transition(redis_conn, 'job-1', 'completed')
+
+    assert sum(active_counts(redis_conn).values()) == 0
+    assert terminal_counts(redis_conn) == {'completed': 1}
+
+
+def test_redelivery_counts_once(redis_conn):
+    transition(redis_conn, 'job-1', 'failed')
+    transition(redis_conn, 'job-1', 'failed')
+
+    assert terminal_counts(redis_conn) == {'failed': 1}
+    assert json.loads(redis_conn.get('job:job-1'))['status'] == 'failed'
+
+
+def test_readers_drop_entries_older_than_job_ttl(redis_conn):
+    pytest.importorskip('flask')
+    pytest.importorskip('pika')
+    pytest.importorskip('prometheus_client')
+    pytest.importorskip('requests')
+    import tts_queue_api
+
+    transition(redis_conn, 'job-1', 'dialing')
+    transition(redis_conn, 'job-2', 'dialing')
+    # Llamada perdida: nunca llega su resultado y su registro expira
+    redis_conn.zadd(status_key('dialing'), {'job-1': time.time() - tts_queue_api.JOB_TTL - 1})
+    redis_conn.delete('job:job-1')
+
+    counts = tts_queue_api.read_job_counts(redis_conn)
+
+    assert counts['dialing'] == 1
+    assert counts['queued'] == 0
@@ -0,0 +1,106 @@
+"""
+Entrega de webhooks con plazo (sin pérdidas si el notificador cae) y
+validación de callback_url
+"""
+
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+pytest.importorskip('requests')
+
+from webhook_notifier import PROMOTE_SCRIPT, WebhookNotifier, callback_url_error  # noqa: E402
+
+QUEUE_KEY = 'webhooks:pending'
+RETRY_KEY = 'webhooks:retry'
+PROCESSING_KEY = 'webhooks:processing'
+
+
+def notification(job_id):
+    return {'callback_url': 'https://example.com/hook', 'attempts': 0,
+            'body': {'event': 'job.answered', 'job_id': job_id}}
+
+
+@pytest.fixture
+def redis_conn():
+    conn = fakeredis.FakeRedis()
+    for job_id in ('job-1', 'job-2'):
+        conn.rpush(QUEUE_KEY, json.dumps(notification(job_id)))
+    return conn
+
+
+def make_notifier(redis_conn, results):
+    notifier = WebhookNotifier(redis_conn, QUEUE_KEY, RETRY_KEY, PROCESSING_KEY, lease=60)
+    notifier.deliver = lambda n: results[n['body']['job_id']]
+    return notifier
+
+
+def test_claimed_batch_survives_a_crash(redis_conn):
+    notifier = make_notifier(redis_conn, {})
+
+    batch = notifier.next_batch()
+    # El notificador cae aquí: nada confirmado, nada pendiente
+    assert [n['body']['job_id'] for _, n in batch] == ['job-1', 'job-2']
+    assert redis_conn.llen(QUEUE_KEY) == 0
+    assert redis_conn.zcard(PROCESSING_KEY) == 2
+
+    promote = redis_conn.register_script(PROMOTE_SCRIPT)
+    _, deadline = redis_conn.zrange(PROCESSING_KEY, 0, 0, withscores=True)[0]
+    promote(keys=[PROCESSING_KEY, QUEUE_KEY], args=[deadline + 1, 50])
+
+    assert redis_conn.zcard(PROCESSING_KEY) == 0
+    assert redis_conn.llen(QUEUE_KEY) == 2
+
+
+def test_outcomes_are_acknowledged(redis_conn):
+    notifier = make_notifier(redis_conn, {
+        'job-1': (None, False),
+        'job-2': ('HTTP 503', True),
+    })
+
+    notifier.deliver_batch(notifier.next_batch())
+
+    assert redis_conn.zcard(PROCESSING_KEY) == 0
+    [retry] = redis_conn.zrange(RETRY_KEY, 0, -1)
+    assert json.loads(retry)['body']['job_id'] == 'job-2'
+    assert json.loads(retry)['attempts'] == 1
+
+
+def test_permanent_errors_are_not_retried(redis_conn):
+    notifier = make_notifier(redis_conn, {
+        'job-1': ('host con dirección no pública', False),
+        'job-2': ('host con dirección no pública', False),
+    })
+
+    notifier.deliver_batch(notifier.next_batch())
+
+    assert redis_conn.zcard(PROCESSING_KEY) == 0
+    assert redis_conn.zcard(RETRY_KEY) == 0
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1:5000/hook',
+    'http://10.0.0.5/hook',
+    'http://169.254.169.254/latest/meta-data',
+    'http://[::1]/hook',
+    'http://localhost/hook',
+    'http://redis:6379/',
+    'ftp://example.com/hook',
+    'http://example.com:99999/hook',
+])
+def test_internal_callback_urls_are_rejected(url):
+    assert callback_url_error(url) is not None
+
+
+def test_public_callback_urls_are_accepted():
+    assert callback_url_error('https://example.com/tts-hook') is None
+    assert callback_url_error('http://93.184.216.34/hook') is None
+
+
+def test_allowed_hosts_restrict_callbacks():
+    allowed = ['example.com']
+    assert callback_url_error('https://hooks.example.com/x', allowed) is None
+    assert callback_url_error('https://example.org/x', allowed) is not None
+    assert callback_url_error('https://badexample.com/x', allowed) is not None
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Cliente del Asterisk Manager Interface (AMI) con conexiones persistentes
+"""
+
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AMIError(Exception):
+    """Respuesta de error de Asterisk o conexión AMI no disponible"""
+
+
+def format_message(fields):
+    """Serializar una acción o evento: pares (clave, valor) y línea en blanco"""
+    lines = [f"{key}: {value}" for key, value in fields]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+
+def read_message(stream):
+    """
+    Leer un mensaje AMI de un archivo binario (socket.makefile('rb')).
+
+    Devuelve un dict (las claves repetidas conservan el último valor) o None
+    si la conexión se cerró.
+    """
+    message = {}
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+        if not line:
+            if message:
+                return message
+            continue
+        key, sep, value = line.partition(':')
+        if sep:
+            message[key.strip()] = value.strip()
+
+
+class AMIConnection:
+    """
+    Una sesión AMI autenticada.
+
+    Las acciones de varios hilos se multiplexan por ActionID: cada una espera
+    su respuesta en un Future que resuelve el hilo lector, que además entrega
+    los eventos a on_event. on_close se llama cuando una sesión abierta se
+    cierra o se cae.
+    """
+
+    def __init__(self, host, port, username, secret, timeout=5.0, events=False, on_event=None,
+                 on_close=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.secret = secret
+        self.timeout = timeout
+        self.events = events
+        self.on_event = on_event
+        self.on_close = on_close
+        self.sock = None
+        self.stream = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.connected = False
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        stream = sock.makefile('rb')
+        banner = stream.readline().decode('utf-8', errors='replace').strip()
+        sock.settimeout(None)
+        self.sock, self.stream = sock, stream
+        self.connected = True
+
+        threading.Thread(
+            target=self.read_loop, name=f'ami-{self.host}:{self.port}', daemon=True
+        ).start()
+
+        response = self.send_action('Login', [
+            ('Username', self.username),
+            ('Secret', self.secret),
+            ('Events', 'call' if self.events else 'off'),
+        ])
+        if response.get('Response') != 'Success':
+            self.close()
+            raise AMIError(f"Login AMI rechazado: {response.get('Message', '')}")
+        logger.info(f"✅ Conectado a AMI {self.host}:{self.port} ({banner})")
+
+    def send_action(self, action, fields, action_id=None, timeout=None):
+        """Enviar una acción y esperar su respuesta (dict); AMIError si no llega a tiempo"""
+        if not self.connected:
+            raise AMIError('Conexión AMI cerrada')
+
+        action_id = action_id or uuid.uuid4().hex
+        future = Future()
+        with self.lock:
+            self.pending[action_id] = future
+        try:
+            data = format_message([('Action', action), ('ActionID', action_id), *fields])
+            with self.write_lock:
+                self.sock.sendall(data)
+            return future.result(timeout or self.timeout)
+        except FutureTimeout:
+            # En Python < 3.11 no es el TimeoutError integrado
+            raise AMIError(f'Sin respuesta AMI a {action} en {timeout or self.timeout}s') from None
+        except OSError as e:
+            self.close()
+            raise AMIError(f'Error enviando acción AMI: {e}') from e
+        finally:
+            with self.lock:
+                self.pending.pop(action_id, None)
+
+    def read_loop(self):
+        try:
+            while True:
+                message = read_message(self.stream)
+                if message is None:
+                    break
+                if 'Event' in message:
+                    if self.on_event:
+                        try:
+                            self.on_event(message)
+                        except Exception as e:
+                            logger.error(f"❌ Error procesando evento AMI {message.get('Event')}: {e}")
+                    continue
+                with self.lock:
+                    future = self.pending.get(message.get('ActionID'))
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.connected:
+            return
+        self.connected = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(AMIError('Conexión AMI cerrada'))
+        logger.warning(f"⚠️ Conexión AMI {self.host}:{self.port} cerrada")
+        if self.on_close:
+            self.on_close()
+
+
+class AMIPool:
+    """
+    Conjunto fijo de sesiones AMI persistentes, usadas en turno rotatorio.
+
+    Solo la primera sesión se suscribe a eventos (cada sesión suscrita recibe
+    todos los eventos de Asterisk). Las sesiones caídas se reabren en el
+    siguiente uso; la de eventos, además, la vigila un hilo que le envía
+    Ping cada `keepalive` segundos y la reabre con backoff si cae, para no
+    perder eventos mientras no hay acciones. on_events_lost se llama cuando
+    la sesión de eventos cae (lo ocurrido hasta reabrirla no llegará) y
+    on_keepalive en cada vuelta del hilo.
+    """
+
+    def __init__(self, host, port, username, secret, size=2, timeout=5.0, on_event=None,
+                 on_events_lost=None, on_keepalive=None, keepalive=10.0, max_backoff=30.0):
+        self.on_events_lost = on_events_lost
+        self.on_keepalive = on_keepalive
+        self.keepalive = keepalive
+        self.max_backoff = max_backoff
+        self.closing = False
+        self.stop_event = threading.Event()
+        self.connections = [
+            AMIConnection(host, port, username, secret, timeout,
+                          events=(index == 0 and on_event is not None), on_event=on_event,
+                          on_close=self.events_closed if index == 0 and on_event is not None else None)
+            for index in range(max(size, 1))
+        ]
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    @property
+    def event_connection(self):
+        return self.connections[0] if self.connections[0].events else None
+
+    def connect(self):
+        for connection in self.connections:
+            connection.connect()
+        if self.event_connection is not None and self.keepalive:
+            threading.Thread(target=self.keepalive_loop, name='ami-keepalive', daemon=True).start()
+
+    def events_closed(self):
+        if not self.closing and self.on_events_lost:
+            try:
+                self.on_events_lost()
+            except Exception as e:
+                logger.error(f"❌ Error tras caer la sesión de eventos AMI: {e}")
+
+    def keepalive_loop(self):
+        """Ping a la sesión de eventos; si cae, reabrirla con backoff exponencial"""
+        connection = self.event_connection
+        delay = self.keepalive
+        backoff = 1.0
+        while not self.stop_event.wait(delay):
+            try:
+                if connection.connected:
+                    connection.send_action('Ping', [])
+                else:
+                    with self.lock:
+                        if not connection.connected:
+                            connection.connect()
+                    logger.info(f"🔄 Sesión de eventos AMI {connection.host}:{connection.port} reabierta")
+                delay, backoff = self.keepalive, 1.0
+            except (AMIError, OSError) as e:
+                # Sin respuesta al Ping la sesión no sirve: se cierra y se reabre
+                connection.close()
+                delay, backoff = backoff, min(backoff * 2, self.max_backoff)
+                logger.warning(f"⚠️ Sesión de eventos AMI caída ({e}), reintento en {delay:.0f}s")
+            if self.on_keepalive:
+                try:
+                    self.on_keepalive()
+                except Exception as e:
+                    logger.error(f"❌ Error en la revisión periódica AMI: {e}")
+
+    def send_action(self, action, fields, action_id=None, timeout=None):
+        with self.lock:
+            connection = self.connections[self.next_index]
+            self.next_index = (self.next_index + 1) % len(self.connections)
+            if not connection.connected:
+                try:
+                    connection.connect()
+                except OSError as e:
+                    raise AMIError(f'No se pudo conectar a AMI: {e}') from e
+        return connection.send_action(action, fields, action_id, timeout)
+
+    def close(self):
+        self.closing = True
+        self.stop_event.set()
+        for connection in self.connections:
+            connection.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Cache de audio TTS direccionado por contenido, compartido entre workers
+"""
+
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+import logging
+
+from sound_files import refs_key
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de claves en Redis
+CACHE_PREFIX = 'tts_cache'
+
+# Puntaje que supera cualquier último acceso (invalidación incondicional)
+ANY_SCORE = 1e18
+
+# Elimina una entrada del índice LRU solo si sigue inactiva (reclamo atómico
+# entre workers: solo quien la saca del índice borra el archivo). Con
+# ARGV[4] = '1' se ignoran las referencias de llamadas (KEYS[2]); si no, una
+# entrada que aún reproduce alguna llamada pasa al final del LRU.
+CLAIM_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not score or tonumber(score) > tonumber(ARGV[2]) then
+    return 0
+end
+if ARGV[4] ~= '1' then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+    if redis.call('ZCARD', KEYS[2]) > 0 then
+        redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+        return 0
+    end
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def normalize_text(text):
+    """Normalizar texto para que variaciones de espacios compartan entrada"""
+    return ' '.join(text.split())
+
+
+class AudioCache:
+    """
+    Cache de archivos de sonido Asterisk indexado en Redis.
+
+    Cada entrada se identifica por el hash de (texto, idioma, motor, formato)
+    y apunta a un archivo con nombre determinista dentro del directorio de
+    sonidos, de modo que varios contenedores que montan el mismo directorio
+    pueden compartirla. La expulsión es LRU acotada por bytes totales y por
+    edad máxima; las entradas usadas recientemente o referenciadas por
+    llamadas pendientes (SoundFileManager) nunca se expulsan.
+    """
+
+    def __init__(self, redis_client, sounds_dir, max_bytes, max_age, min_idle):
+        self.redis = redis_client
+        self.sounds_dir = sounds_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_idle = min_idle
+        self.lru_key = f'{CACHE_PREFIX}:lru'
+        self.bytes_key = f'{CACHE_PREFIX}:bytes'
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+
+    def make_key(self, text, language, engine, audio_format):
+        """Calcular clave de cache para un texto normalizado"""
+        raw = '\x1f'.join([
+            engine,
+            audio_format,
+            (language or '').strip().lower(),
+            normalize_text(text),
+        ])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def filename_for(self, cache_key):
+        """Nombre de sonido Asterisk (sin extensión) para una clave"""
+        return f'tts_c_{cache_key[:20]}'
+
+    def path_for(self, audio_name, audio_format='gsm'):
+        return os.path.join(self.sounds_dir, f'{audio_name}.{audio_format}')
+
+    def _entry_key(self, cache_key):
+        return f'{CACHE_PREFIX}:entry:{cache_key}'
+
+    def lookup(self, cache_key):
+        """
+        Buscar audio en cache. Devuelve el nombre del sonido o None.
+
+        El acceso se registra en la misma ida y vuelta a Redis; si la entrada
+        fue reclamada por otro worker entre medias, se trata como fallo.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hget(self._entry_key(cache_key), 'audio_name')
+        pipe.zadd(self.lru_key, {cache_key: time.time()}, xx=True, ch=True)
+        audio_name, touched = pipe.execute()
+
+        if not audio_name or not touched:
+            return None
+
+        audio_name = audio_name.decode() if isinstance(audio_name, bytes) else audio_name
+        if not os.path.exists(self.path_for(audio_name)):
+            # El archivo desapareció del volumen compartido: invalidar entrada
+            self._remove(cache_key, ANY_SCORE)
+            return None
+
+        return audio_name
+
+    def store(self, cache_key, audio_name):
+        """Registrar un archivo recién generado en el cache"""
+        size = os.path.getsize(self.path_for(audio_name))
+        now = time.time()
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self._entry_key(cache_key), mapping={
+            'audio_name': audio_name,
+            'bytes': size,
+            'created_at': now,
+        })
+        pipe.zadd(self.lru_key, {cache_key: now}, nx=True)
+        _, added = pipe.execute()
+
+        # Contabilizar bytes solo si la entrada es nueva en el índice
+        if added:
+            self.redis.incrby(self.bytes_key, size)
+
+        self.evict()
+
+    @contextmanager
+    def generation_lock(self, cache_key, timeout=120, wait=60):
+        """
+        Lock distribuido para que solo un worker genere cada entrada.
+
+        Si no se obtiene a tiempo se continúa sin él: los nombres deterministas
+        y el renombrado atómico hacen que una generación duplicada sea inocua.
+        """
+        lock = self.redis.lock(
+            f'{CACHE_PREFIX}:lock:{cache_key}',
+            timeout=timeout,
+            blocking_timeout=wait
+        )
+        acquired = lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logger.warning(f"⚠️ Lock de cache expirado antes de liberar: {e}")
+
+    def _remove(self, cache_key, max_score):
+        """Reclamar y borrar una entrada si su último acceso es <= max_score y no está en uso"""
+        force = max_score == ANY_SCORE
+        if not self._claim(
+            keys=[self.lru_key, refs_key(self.filename_for(cache_key))],
+            args=[cache_key, max_score, time.time(), '1' if force else '0']
+        ):
+            return 0
+
+        entry_key = self._entry_key(cache_key)
+        audio_name, size = self.redis.hmget(entry_key, 'audio_name', 'bytes')
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(entry_key)
+        if size:
+            pipe.decrby(self.bytes_key, int(size))
+        pipe.execute()
+
+        if audio_name:
+            audio_name = audio_name.decode() if isinstance(audio_name, bytes) else audio_name
+            try:
+                os.remove(self.path_for(audio_name))
+            except FileNotFoundError:
+                pass
+        return int(size or 0)
+
+    def evict(self, batch=50):
+        """Expulsar entradas viejas y las menos usadas si se supera el presupuesto"""
+        now = time.time()
+        idle_limit = now - self.min_idle
+        removed = 0
+
+        # Expulsión por edad
+        expired = self.redis.zrangebyscore(self.lru_key, 0, now - self.max_age, start=0, num=batch)
+        for cache_key in expired:
+            cache_key = cache_key.decode() if isinstance(cache_key, bytes) else cache_key
+            if self._remove(cache_key, now - self.max_age):
+                removed += 1
+
+        # Expulsión LRU por tamaño total
+        while int(self.redis.get(self.bytes_key) or 0) > self.max_bytes:
+            candidates = self.redis.zrangebyscore(self.lru_key, 0, idle_limit, start=0, num=batch)
+            if not candidates:
+                break
+            for cache_key in candidates:
+                cache_key = cache_key.decode() if isinstance(cache_key, bytes) else cache_key
+                if self._remove(cache_key, idle_limit):
+                    removed += 1
+
+        if removed:
+            logger.info(f"🧹 Cache de audio: {removed} entradas expulsadas")
+        return removed
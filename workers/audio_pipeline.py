@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Pipeline en memoria para sintetizar, transcodificar y publicar audio TTS
+"""
+
+import io
+import os
+import re
+import grp
+import pwd
+import uuid
+import logging
+
+from gtts import gTTS
+from pydub import AudioSegment
+
+from job_retry import PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+# Formato que entiende Asterisk para Playback()
+ASTERISK_SAMPLE_RATE = 8000
+ASTERISK_CHANNELS = 1
+
+# Fronteras de corte para sintetizar textos largos por fragmentos
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…;])\s+')
+CLAUSE_BOUNDARY = re.compile(r'(?<=[,:])\s+')
+
+
+def synthesize_mp3(text, language='es', timeout=None):
+    """Sintetizar texto con gTTS directamente a memoria (timeout por petición HTTP)"""
+    try:
+        tts = gTTS(text=text, lang=language, slow=False, timeout=timeout)
+    except ValueError as e:
+        raise PermanentJobError(f'Idioma no soportado por gTTS: {language}') from e
+    buffer = io.BytesIO()
+    tts.write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+def transcode_for_asterisk(audio_bytes, source_format='mp3', audio_format='gsm'):
+    """Decodificar audio desde memoria y exportarlo a 8 kHz mono"""
+    audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=source_format)
+    audio = audio.set_frame_rate(ASTERISK_SAMPLE_RATE).set_channels(ASTERISK_CHANNELS)
+
+    output = io.BytesIO()
+    audio.export(output, format=audio_format)
+    return output.getvalue()
+
+
+def split_text(text, max_chars=100):
+    """
+    Dividir un texto en fragmentos de hasta max_chars caracteres.
+
+    Se corta por oraciones; las que superan el límite se cortan por cláusulas
+    y, en último caso, por palabras. Cada oración es un fragmento propio (no se
+    agrupan), así que cambiar una oración no altera los fragmentos vecinos y
+    el resto sigue saliendo del cache.
+    """
+    chunks = []
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        if len(sentence) <= max_chars:
+            if sentence:
+                chunks.append(sentence)
+            continue
+        for clause in _pack(CLAUSE_BOUNDARY.split(sentence), max_chars):
+            if len(clause) <= max_chars:
+                chunks.append(clause)
+            else:
+                chunks.extend(_pack(clause.split(), max_chars))
+    return chunks
+
+
+def _pack(parts, max_chars):
+    """Unir partes consecutivas con espacios sin superar max_chars"""
+    packed = []
+    current = ''
+    for part in parts:
+        candidate = f'{current} {part}' if current else part
+        if current and len(candidate) > max_chars:
+            packed.append(current)
+            candidate = part
+        current = candidate
+    if current:
+        packed.append(current)
+    return packed
+
+
+def concatenate_audio(parts, audio_format='gsm'):
+    """
+    Concatenar fragmentos de audio ya transcodificados.
+
+    GSM en crudo son tramas independientes de 33 bytes, así que basta con
+    unir los bytes; otros formatos se decodifican y se vuelven a exportar.
+    """
+    if audio_format == 'gsm':
+        return b''.join(parts)
+
+    audio = AudioSegment.empty()
+    for part in parts:
+        audio += AudioSegment.from_file(io.BytesIO(part), format=audio_format)
+
+    output = io.BytesIO()
+    audio.export(output, format=audio_format)
+    return output.getvalue()
+
+
+def resolve_owner(user, group=None):
+    """
+    Resolver uid/gid de un usuario del sistema.
+
+    Devuelve None si el usuario no existe en este contenedor (por ejemplo,
+    'asterisk' cuando el spool es un volumen montado desde el host).
+    """
+    try:
+        uid = pwd.getpwnam(user).pw_uid
+        gid = grp.getgrnam(group or user).gr_gid
+        return uid, gid
+    except KeyError:
+        return None
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def atomic_write(path, data, owner=None, mode=0o644):
+    """
+    Escribir un archivo de forma atómica.
+
+    El contenido va primero a un archivo oculto en el mismo directorio y luego
+    se renombra sobre el destino, de modo que Asterisk (que ignora archivos
+    que empiezan por '.') nunca ve un archivo a medio escribir. Permisos y
+    propietario se fijan sobre el descriptor, sin lanzar procesos.
+    """
+    directory, filename = os.path.split(path)
+    temp_path = os.path.join(directory, f'.{filename}.{uuid.uuid4().hex[:8]}.tmp')
+
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            os.fchmod(f.fileno(), mode)
+            if owner is not None:
+                try:
+                    os.fchown(f.fileno(), *owner)
+                except PermissionError:
+                    logger.warning(f"⚠️ Sin permisos para cambiar propietario de {path}")
+        os.replace(temp_path, path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return path
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Control de admisión de llamadas compartido por todos los workers (Redis)
+"""
+
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Admite una llamada si el troncal tiene canales libres y el ritmo lo permite.
+# Los canales son un zset job_id -> vencimiento de la reserva: si una
+# liberación se pierde, el canal vuelve solo al vencer. El ritmo es un token
+# bucket con capacidad max(1, cps). El reloj es el de Redis, común a todos
+# los workers. Devuelve {admitida, milisegundos a esperar (0: sin estimación)}.
+ADMISSION_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local max_channels = tonumber(ARGV[2])
+local cps = tonumber(ARGV[3])
+local lease = tonumber(ARGV[4])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return {1, 0}
+end
+if redis.call('ZCARD', KEYS[1]) >= max_channels then
+    return {0, 0}
+end
+
+if cps > 0 then
+    local burst = math.max(1, cps)
+    local bucket = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * cps)
+    if tokens < 1 then
+        redis.call('HSET', KEYS[2], 'tokens', tokens, 'ts', now)
+        return {0, math.ceil((1 - tokens) / cps * 1000)}
+    end
+    redis.call('HSET', KEYS[2], 'tokens', tokens - 1, 'ts', now)
+    redis.call('EXPIRE', KEYS[2], 3600)
+end
+
+redis.call('ZADD', KEYS[1], now + lease, ARGV[1])
+return {1, 0}
+"""
+
+
+class AdmissionController:
+    """
+    Límite de canales simultáneos y de llamadas por segundo por troncal SIP.
+
+    Un worker reserva un canal antes de entregar la llamada a Asterisk y lo
+    libera cuando la llamada termina (CallDoneWatcher) o si no llega a
+    entregarla. Reservar dos veces el mismo job_id no ocupa dos canales.
+    """
+
+    def __init__(self, redis_client, trunk, max_channels, cps, lease=900, poll_interval=0.5):
+        self.redis = redis_client
+        self.trunk = trunk
+        self.max_channels = max_channels
+        self.cps = cps
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.channels_key = f"trunk:{trunk}:channels"
+        self.pacing_key = f"trunk:{trunk}:pacing"
+        self.admit = redis_client.register_script(ADMISSION_SCRIPT)
+
+    def keys(self):
+        return [self.channels_key, self.pacing_key]
+
+    def args(self, job_id):
+        return [job_id, self.max_channels, self.cps, self.lease]
+
+    def retry_delay(self, wait_ms):
+        return wait_ms / 1000 if wait_ms else self.poll_interval
+
+    def try_acquire(self, job_id):
+        """Intentar reservar un canal; devuelve (admitida, segundos a esperar)"""
+        admitted, wait_ms = self.admit(keys=self.keys(), args=self.args(job_id))
+        return bool(admitted), self.retry_delay(wait_ms)
+
+    def acquire(self, job_id, timeout):
+        """Esperar un canal libre y turno de ritmo, como mucho timeout segundos"""
+        deadline = time.monotonic() + timeout
+        while True:
+            admitted, delay = self.try_acquire(job_id)
+            if admitted:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Troncal {self.trunk} sin canales libres tras {timeout}s")
+            time.sleep(min(delay, remaining))
+
+    def release(self, job_id):
+        return self.redis.zrem(self.channels_key, job_id)
+
+    def in_use(self):
+        return self.redis.zcount(self.channels_key, time.time(), '+inf')
+
+
+def read_call_file(path):
+    """
+    Leer un archivo .call (o su copia archivada en outgoing_done).
+
+    Devuelve las claves ('Channel', 'Status', ...) y, aparte, las variables
+    de las líneas "Set: NOMBRE=valor".
+    """
+    fields, variables = {}, {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            key, value = key.strip(), value.strip()
+            if key == 'Set':
+                name, _, var_value = value.partition('=')
+                variables[name.strip()] = var_value.strip()
+            else:
+                fields[key] = value
+    return fields, variables
+
+
+class CallDoneWatcher(threading.Thread):
+    """
+    Vigilar outgoing_done, donde Asterisk deja los .call con "Archive: yes"
+    al terminar (con la línea "Status: Completed|Expired|Failed").
+
+    Llama a on_done(job_id, fields, variables) una vez por archivo, con la
+    hora de archivado en fields['Time'], y después borra el archivo para que
+    el directorio no crezca con cada llamada. Varios workers pueden vigilar
+    el mismo directorio: las acciones son idempotentes, así que si dos
+    procesan el mismo archivo antes de que se borre no pasa nada, y si el
+    worker cae a mitad otro lo procesa. Los .call del sistema (prefijo
+    call_) más viejos que la ventana de revisión se borran sin procesar; los
+    demás archivos del directorio no se tocan.
+    """
+
+    FILE_PREFIX = 'call_'
+
+    def __init__(self, done_dir, on_done, interval=2.0, lookback=900):
+        super().__init__(name='call-done-watcher', daemon=True)
+        self.done_dir = done_dir
+        self.on_done = on_done
+        self.interval = interval
+        self.lookback = lookback
+        # Al arrancar se revisan también las llamadas terminadas hace poco
+        self.since = time.time() - lookback
+        self.seen = {}
+        self.unlink_failed = False
+        self.stop_event = threading.Event()
+
+    def discard(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Sin permiso de escritura en outgoing_done se sigue como antes:
+            # la ventana de revisión evita reprocesar
+            if not self.unlink_failed:
+                logger.warning(f"⚠️ No se pueden borrar las llamadas archivadas de {self.done_dir}: {e}")
+                self.unlink_failed = True
+
+    def scan(self):
+        started = time.time()
+        try:
+            entries = list(os.scandir(self.done_dir))
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            if not entry.name.endswith('.call') or entry.name in self.seen:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                if mtime < self.since:
+                    if entry.name.startswith(self.FILE_PREFIX) and mtime < started - self.lookback:
+                        self.discard(entry.path)
+                    continue
+                fields, variables = read_call_file(entry.path)
+            except OSError:
+                continue
+
+            # Hora de archivado: fin de la llamada
+            fields['Time'] = mtime
+            job_id = variables.get('JOB_ID')
+            if job_id:
+                try:
+                    self.on_done(job_id, fields, variables)
+                except Exception as e:
+                    # Se reintenta en la próxima revisión
+                    logger.error(f"❌ Error procesando llamada terminada {job_id}: {e}")
+                    continue
+                self.discard(entry.path)
+            self.seen[entry.name] = mtime
+
+        # Solo se recuerdan los archivos que aún caen en la ventana de revisión
+        self.since = started - self.interval * 5
+        self.seen = {name: mtime for name, mtime in self.seen.items() if mtime >= self.since}
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"❌ Error vigilando {self.done_dir}: {e}")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Originación de llamadas en Asterisk: archivos .call en el spool o acciones AMI
+"""
+
+import threading
+import time
+import uuid
+import logging
+
+from ami_client import AMIError, AMIPool
+from audio_pipeline import atomic_write
+from call_outcomes import ami_outcome, spool_outcome
+from job_retry import PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+# Destino en el dialplan (config/extensions_queue.conf)
+CALL_CONTEXT = 'internal'
+CALL_EXTENSION = 'tts_playback'
+CALL_PRIORITY = 1
+
+
+class CallRejected(PermanentJobError):
+    """Asterisk rechazó la llamada al originarla (reintentar no la cambia)"""
+
+
+def call_variables(phone_number, audio_filename, job_id):
+    """Variables de canal que usa tts_playback"""
+    return [
+        ('AUDIO_FILE', audio_filename),
+        ('JOB_ID', job_id),
+        ('PHONE_NUMBER', phone_number),
+    ]
+
+
+def build_call_file(trunk, phone_number, audio_filename, job_id, wait_time=30):
+    """Contenido del archivo .call para el dialplan tts_playback"""
+    variables = ''.join(
+        f"Set: {name}={value}\n"
+        for name, value in call_variables(phone_number, audio_filename, job_id)
+    )
+    return f"""Channel: SIP/{trunk}/{phone_number}
+Context: {CALL_CONTEXT}
+Extension: {CALL_EXTENSION}
+Priority: {CALL_PRIORITY}
+{variables}MaxRetries: 2
+RetryTime: 60
+WaitTime: {wait_time}
+Archive: yes
+"""
+
+
+class SpoolOriginator:
+    """
+    Escribir un .call en el spool de Asterisk.
+
+    Asterisk no confirma nada al escribirlo: el resultado solo se conoce
+    cuando archiva el archivo en outgoing_done (CallDoneWatcher).
+    """
+
+    name = 'spool'
+    outcome = staticmethod(spool_outcome)
+
+    def __init__(self, trunk, spool_dir, owner=None, wait_time=30):
+        self.trunk = trunk
+        self.spool_dir = spool_dir
+        self.owner = owner
+        self.wait_time = wait_time
+
+    def start(self):
+        pass
+
+    def originate(self, phone_number, audio_filename, job_id):
+        """Devuelve los campos a guardar en el trabajo"""
+        call_content = build_call_file(self.trunk, phone_number, audio_filename, job_id, self.wait_time)
+
+        # Escribir directamente en el spool: Asterisk solo ve el archivo
+        # cuando el renombrado atómico lo deja completo
+        spool_file = f'{self.spool_dir}/call_{job_id}.call'
+        atomic_write(spool_file, call_content.encode('utf-8'), owner=self.owner)
+
+        logger.info(f"📞 Archivo de llamada creado: {spool_file}")
+        return {'call_backend': self.name, 'call_file': spool_file}
+
+    def stop(self):
+        pass
+
+
+class AMIOriginator:
+    """
+    Enviar Originate por un pool de sesiones AMI persistentes.
+
+    Con Async, Asterisk responde al instante si no puede originar la llamada
+    (canal inválido, permisos, destino inexistente): se lanza CallRejected y
+    el trabajo falla sin esperar a la marcación. El resultado de la marcación
+    llega después en OriginateResponse (mismo ActionID): si contestó se
+    avisa a on_answer(job_id, at) y el cuelgue llega en Hangup (Uniqueid del
+    canal). El fin de la llamada se entrega a on_done(job_id, fields,
+    variables) como un .call archivado, con Reason y Time.
+
+    A diferencia del spool, Asterisk no reintenta: los reintentos quedan a
+    cargo de la cola.
+
+    Si un evento se pierde (la sesión de eventos cayó), la llamada no queda
+    abierta para siempre ocupando su canal de la troncal: la que no recibió
+    OriginateResponse termina como fallida pasado wait_time + event_grace
+    desde el Originate, y las contestadas cuando cae la sesión terminan como
+    completadas si su Hangup no llega en event_grace segundos.
+    """
+
+    name = 'ami'
+    outcome = staticmethod(ami_outcome)
+
+    def __init__(self, host, port, username, secret, trunk, on_done=None, on_answer=None,
+                 pool_size=2, timeout=5.0, wait_time=30, keepalive=10.0, event_grace=120.0):
+        self.trunk = trunk
+        self.on_done = on_done
+        self.on_answer = on_answer
+        self.wait_time = wait_time
+        self.event_grace = event_grace
+        self.pool = AMIPool(host, port, username, secret, size=pool_size, timeout=timeout,
+                            on_event=self.handle_event, on_events_lost=self.events_lost,
+                            on_keepalive=self.expire_calls, keepalive=keepalive)
+        # ActionID -> (job_id, variables, hora del Originate) hasta OriginateResponse;
+        # Uniqueid -> (job_id, variables) hasta Hangup
+        self.dialing = {}
+        self.active = {}
+        # Uniqueid -> plazo para el Hangup de las contestadas antes de caer la sesión
+        self.hangup_deadlines = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.pool.connect()
+
+    def originate(self, phone_number, audio_filename, job_id):
+        """Devuelve los campos a guardar en el trabajo; CallRejected si Asterisk la rechaza"""
+        variables = call_variables(phone_number, audio_filename, job_id)
+        action_id = f"tts-{job_id}-{uuid.uuid4().hex[:8]}"
+        fields = [
+            ('Channel', f'SIP/{self.trunk}/{phone_number}'),
+            ('Context', CALL_CONTEXT),
+            ('Exten', CALL_EXTENSION),
+            ('Priority', CALL_PRIORITY),
+            ('Timeout', self.wait_time * 1000),
+            ('Async', 'true'),
+        ] + [('Variable', f'{name}={value}') for name, value in variables]
+
+        # Registrar antes de enviar: OriginateResponse puede llegar enseguida
+        with self.lock:
+            self.dialing[action_id] = (job_id, dict(variables), time.time())
+        try:
+            response = self.pool.send_action('Originate', fields, action_id=action_id)
+        except AMIError:
+            with self.lock:
+                self.dialing.pop(action_id, None)
+            raise
+
+        if response.get('Response') != 'Success':
+            with self.lock:
+                self.dialing.pop(action_id, None)
+            raise CallRejected(f"Asterisk rechazó la llamada: {response.get('Message', 'sin motivo')}")
+
+        logger.info(f"📞 Llamada originada por AMI: {action_id}")
+        return {'call_backend': self.name, 'call_action_id': action_id}
+
+    def handle_event(self, event):
+        """Eventos de la sesión AMI suscrita (hilo lector)"""
+        name = event.get('Event')
+        now = time.time()
+        if name == 'OriginateResponse':
+            answered = event.get('Response') == 'Success'
+            with self.lock:
+                call = self.dialing.pop(event.get('ActionID'), None)
+                if call is not None and answered:
+                    self.active[event.get('Uniqueid')] = call[:2]
+            if call is None:
+                return
+            if answered:
+                if self.on_answer:
+                    self.on_answer(call[0], now)
+            else:
+                self.finish(call, {'Status': 'Failed', 'Reason': event.get('Reason', ''), 'Time': now})
+        elif name == 'Hangup':
+            with self.lock:
+                call = self.active.pop(event.get('Uniqueid'), None)
+                self.hangup_deadlines.pop(event.get('Uniqueid'), None)
+            if call is not None:
+                self.finish(call, {
+                    'Status': 'Completed',
+                    'Reason': '4',
+                    'Cause': event.get('Cause', ''),
+                    'Cause-txt': event.get('Cause-txt', ''),
+                    'Time': now,
+                })
+
+    def events_lost(self):
+        """La sesión de eventos cayó: los Hangup de mientras tanto no llegarán"""
+        deadline = time.time() + self.event_grace
+        with self.lock:
+            for uniqueid in self.active:
+                self.hangup_deadlines.setdefault(uniqueid, deadline)
+            in_flight = len(self.dialing) + len(self.active)
+        if in_flight:
+            logger.warning(f"⚠️ Sesión de eventos AMI caída con {in_flight} llamadas en curso")
+
+    def expire_calls(self):
+        """Cerrar las llamadas cuyo evento ya no puede llegar (libera su canal)"""
+        now = time.time()
+        with self.lock:
+            unanswered = [
+                self.dialing.pop(action_id) for action_id, (_, _, sent_at) in list(self.dialing.items())
+                if now - sent_at > self.wait_time + self.event_grace
+            ]
+            hung_up = [
+                self.active.pop(uniqueid) for uniqueid, deadline in list(self.hangup_deadlines.items())
+                if deadline <= now and uniqueid in self.active
+            ]
+            self.hangup_deadlines = {
+                uniqueid: deadline for uniqueid, deadline in self.hangup_deadlines.items()
+                if uniqueid in self.active
+            }
+        for call in unanswered:
+            logger.warning(f"⚠️ Sin OriginateResponse para {call[0]}: llamada fallida")
+            self.finish(call, {'Status': 'Failed', 'Reason': '0', 'Time': now})
+        for call in hung_up:
+            logger.warning(f"⚠️ Sin Hangup para {call[0]}: llamada cerrada")
+            self.finish(call, {'Status': 'Completed', 'Reason': '4', 'Cause-txt': 'Hangup no recibido',
+                               'Time': now})
+
+    def finish(self, call, fields):
+        job_id, variables = call[:2]
+        if self.on_done:
+            self.on_done(job_id, fields, variables)
+
+    def stop(self):
+        self.pool.close()
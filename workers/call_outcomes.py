@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Seguimiento del resultado de las llamadas: dialing -> answered/busy/no_answer/failed
+"""
+
+import json
+import time
+from datetime import datetime
+import logging
+
+from job_state import JOB_TTL, TRANSITION_SCRIPT, transition_keys, transition_args
+
+logger = logging.getLogger(__name__)
+
+# Contadores acumulados de resultados y segundos totales (tasa de respuesta,
+# tiempo medio hasta contestar y duración media), compartidos con el dashboard
+CALL_STATS_KEY = 'stats:calls'
+
+CALL_OUTCOMES = ('answered', 'busy', 'no_answer', 'failed')
+
+# Status de un .call archivado en outgoing_done. El spool no distingue
+# ocupado de sin respuesta: Expired es que se agotaron los reintentos.
+SPOOL_OUTCOMES = {
+    'Completed': 'answered',
+    'Expired': 'no_answer',
+    'Failed': 'failed',
+}
+
+# Reason de OriginateResponse (códigos de control de Asterisk)
+AMI_REASON_OUTCOMES = {
+    '1': 'no_answer',   # colgó antes de contestar
+    '3': 'no_answer',   # timbró hasta agotar la espera
+    '4': 'answered',
+    '5': 'busy',
+    '8': 'failed',      # congestión
+}
+
+
+def spool_outcome(fields):
+    return SPOOL_OUTCOMES.get(fields.get('Status'), 'failed')
+
+
+def ami_outcome(fields):
+    return AMI_REASON_OUTCOMES.get(fields.get('Reason'), 'failed')
+
+
+def seconds_between(start, end):
+    """Segundos entre dos fechas ISO 8601 del registro (None si falta alguna)"""
+    if not start or not end:
+        return None
+    delta = datetime.fromisoformat(end) - datetime.fromisoformat(start)
+    return round(delta.total_seconds(), 3)
+
+
+class CallOutcomeTracker:
+    """
+    Aplicar a los registros job:<id> lo que Asterisk informa de cada llamada.
+
+    Cada cambio exige el estado anterior esperado (TRANSITION_SCRIPT), así
+    que un mismo resultado observado por varios workers o entregado dos veces
+    se aplica una sola vez. on_result(job_data) recibe el registro cada vez
+    que un cambio se aplica en un estado final (para publicarlo en
+    tts_results).
+    """
+
+    def __init__(self, redis_client, on_result=None, ttl=JOB_TTL):
+        self.redis = redis_client
+        self.on_result = on_result
+        self.ttl = ttl
+        self.transition = redis_client.register_script(TRANSITION_SCRIPT)
+
+    def load(self, job_id):
+        job = self.redis.get(f"job:{job_id}")
+        return json.loads(job) if job else None
+
+    def update(self, job_id, expected, changes):
+        """Aplicar cambios si el trabajo sigue en el estado esperado; devuelve el registro o None"""
+        job_data = self.load(job_id)
+        if job_data is None or job_data.get('status') != expected:
+            return None
+        job_data.update(changes)
+        applied = self.transition(
+            keys=transition_keys(job_id),
+            args=transition_args(job_data, self.ttl, expected=expected),
+        )
+        return job_data if applied else None
+
+    def answered(self, job_id, at=None):
+        """La llamada fue contestada (AMI, antes del cuelgue)"""
+        now = datetime.fromtimestamp(at or time.time()).isoformat()
+        job_data = self.load(job_id)
+        if job_data is None:
+            return None
+        job_data = self.update(job_id, 'dialing', {
+            'status': 'answered',
+            'answered_at': now,
+            'completed_at': now,
+            'ring_duration': seconds_between(job_data.get('dialing_at'), now),
+            'time_to_answer': seconds_between(job_data.get('created_at'), now),
+        })
+        if job_data:
+            self.record('answered', time_to_answer=job_data['time_to_answer'])
+            logger.info(f"✅ Llamada {job_id} contestada ({job_data['time_to_answer']}s desde la creación)")
+            self.publish(job_data)
+        return job_data
+
+    def ended(self, job_id, outcome, at=None, detail=None):
+        """
+        La llamada terminó con el resultado dado.
+
+        Si ya constaba como contestada (AMI) solo se añaden la hora de fin y
+        las duraciones; si seguía marcando, se cierra con el resultado.
+        """
+        now = datetime.fromtimestamp(at or time.time()).isoformat()
+        job_data = self.load(job_id)
+        if job_data is None:
+            logger.warning(f"⚠️ Resultado de llamada para trabajo desconocido o expirado: {job_id}")
+            return None
+
+        if job_data.get('status') == 'answered':
+            job_data = self.update(job_id, 'answered', {
+                'ended_at': now,
+                'talk_duration': seconds_between(job_data.get('answered_at'), now),
+                'call_duration': seconds_between(job_data.get('dialing_at'), now),
+            })
+            if job_data:
+                self.record(None, talk_time=job_data['talk_duration'])
+                self.publish(job_data)
+            return job_data
+
+        changes = {
+            'status': outcome,
+            'ended_at': now,
+            'call_duration': seconds_between(job_data.get('dialing_at'), now),
+        }
+        if outcome == 'failed':
+            changes['failed_at'] = now
+            changes['error'] = f"Llamada fallida{f' ({detail})' if detail else ''}"
+        else:
+            changes['completed_at'] = now
+        if outcome == 'answered':
+            # Spool: solo se sabe que contestó al archivarse la llamada
+            changes['answered_at'] = now
+            changes['time_to_answer'] = seconds_between(job_data.get('created_at'), now)
+
+        job_data = self.update(job_id, 'dialing', changes)
+        if job_data:
+            self.record(outcome, time_to_answer=job_data.get('time_to_answer'))
+            logger.info(f"📴 Llamada {job_id}: {outcome}")
+            self.publish(job_data)
+        return job_data
+
+    def record(self, outcome, time_to_answer=None, talk_time=None):
+        pipe = self.redis.pipeline(transaction=False)
+        if outcome:
+            pipe.hincrby(CALL_STATS_KEY, outcome, 1)
+        if time_to_answer is not None:
+            pipe.hincrbyfloat(CALL_STATS_KEY, 'time_to_answer_total', time_to_answer)
+        if talk_time is not None:
+            pipe.hincrby(CALL_STATS_KEY, 'talk_samples', 1)
+            pipe.hincrbyfloat(CALL_STATS_KEY, 'talk_time_total', talk_time)
+        pipe.execute()
+
+    def publish(self, job_data):
+        if self.on_result:
+            try:
+                self.on_result(job_data)
+            except Exception as e:
+                logger.error(f"❌ Error publicando resultado de {job_data['job_id']}: {e}")
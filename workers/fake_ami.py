@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Servidor AMI de pruebas: imita Login, Ping, Logoff y Originate de Asterisk
+
+Responde a Originate como Asterisk con Async (respuesta inmediata, después
+OriginateResponse y Hangup a todas las sesiones con eventos), sin marcar
+nada. Sirve para probar CALL_ORIGINATOR=ami en local:
+
+    python workers/fake_ami.py --port 5038 --reject 000
+"""
+
+import argparse
+import itertools
+import socket
+import socketserver
+import threading
+import time
+import logging
+
+from ami_client import format_message, read_message
+
+logger = logging.getLogger(__name__)
+
+# Motivo de OriginateResponse según el resultado simulado
+OUTCOME_REASONS = {
+    'answered': '4',
+    'no_answer': '3',
+    'busy': '5',
+    'congestion': '8',
+}
+
+
+class FakeAMIHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.events = False
+
+    def send(self, fields):
+        with self.write_lock:
+            try:
+                self.wfile.write(format_message(fields))
+            except OSError:
+                pass
+
+    def handle(self):
+        server = self.server
+        self.wfile.write(b'Asterisk Call Manager/5.0.1\r\n')
+        authenticated = False
+
+        try:
+            while True:
+                message = read_message(self.rfile)
+                if message is None:
+                    break
+                action = message.get('Action', '').lower()
+                action_id = message.get('ActionID', '')
+                reply = [('Response', 'Success'), ('ActionID', action_id)]
+
+                if action == 'login':
+                    if (message.get('Username'), message.get('Secret')) != (server.username, server.secret):
+                        self.send([('Response', 'Error'), ('ActionID', action_id),
+                                   ('Message', 'Authentication failed')])
+                        break
+                    authenticated = True
+                    self.events = message.get('Events', 'on').lower() != 'off'
+                    if self.events:
+                        server.subscribe(self)
+                    self.send(reply + [('Message', 'Authentication accepted')])
+                elif not authenticated:
+                    self.send([('Response', 'Error'), ('ActionID', action_id),
+                               ('Message', 'Missing action in request')])
+                elif action == 'ping':
+                    self.send(reply + [('Ping', 'Pong'), ('Timestamp', f'{time.time():.6f}')])
+                elif action == 'logoff':
+                    self.send([('Response', 'Goodbye'), ('ActionID', action_id),
+                               ('Message', 'Thanks for all the fish.')])
+                    break
+                elif action == 'originate':
+                    reply = server.originate(message, action_id)
+                    if reply:
+                        self.send(reply)
+                else:
+                    self.send([('Response', 'Error'), ('ActionID', action_id),
+                               ('Message', 'Invalid/unknown command')])
+        finally:
+            server.unsubscribe(self)
+
+
+class FakeAMIServer(socketserver.ThreadingTCPServer):
+    """
+    Servidor AMI en memoria.
+
+    reject: números a los que Originate responde Error al instante.
+    unresponsive: números a los que Originate no responde (AMI colgado).
+    outcome: resultado de las demás ('answered', 'no_answer', 'busy',
+    'congestion'); las contestadas cuelgan tras call_duration segundos.
+    originated guarda cada Originate aceptado, para las comprobaciones.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), username='tts', secret='tts',
+                 outcome='answered', reject=(), unresponsive=(), answer_delay=0.05, call_duration=0.2):
+        super().__init__(address, FakeAMIHandler)
+        self.username = username
+        self.secret = secret
+        self.outcome = outcome
+        self.reject = set(reject)
+        self.unresponsive = set(unresponsive)
+        self.answer_delay = answer_delay
+        self.call_duration = call_duration
+        self.originated = []
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.uniqueids = itertools.count(1)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def subscribe(self, handler):
+        with self.lock:
+            self.subscribers.add(handler)
+
+    def unsubscribe(self, handler):
+        with self.lock:
+            self.subscribers.discard(handler)
+
+    def drop_event_sessions(self):
+        """Cortar las sesiones con eventos (caída de red o reinicio de Asterisk)"""
+        with self.lock:
+            subscribers, self.subscribers = list(self.subscribers), set()
+        for handler in subscribers:
+            try:
+                handler.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def broadcast(self, fields):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for handler in subscribers:
+            handler.send(fields)
+
+    def originate(self, message, action_id):
+        channel = message.get('Channel', '')
+        tech, _, rest = channel.partition('/')
+        number = rest.rsplit('/', 1)[-1]
+        if not tech or not number or not (message.get('Exten') or message.get('Application')):
+            return [('Response', 'Error'), ('ActionID', action_id), ('Message', 'Channel not specified')]
+        if number in self.reject:
+            return [('Response', 'Error'), ('ActionID', action_id), ('Message', 'Originate failed')]
+        if number in self.unresponsive:
+            return None
+
+        with self.lock:
+            self.originated.append(message)
+        uniqueid = f"{time.time():.0f}.{next(self.uniqueids)}"
+        threading.Thread(
+            target=self.dial, args=(channel, action_id, uniqueid), daemon=True
+        ).start()
+        return [('Response', 'Success'), ('ActionID', action_id),
+                ('Message', 'Originate successfully queued')]
+
+    def dial(self, channel, action_id, uniqueid):
+        time.sleep(self.answer_delay)
+        answered = self.outcome == 'answered'
+        self.broadcast([
+            ('Event', 'OriginateResponse'),
+            ('ActionID', action_id),
+            ('Response', 'Success' if answered else 'Failure'),
+            ('Channel', channel),
+            ('Reason', OUTCOME_REASONS.get(self.outcome, '0')),
+            ('Uniqueid', uniqueid),
+        ])
+        if answered:
+            time.sleep(self.call_duration)
+            self.broadcast([
+                ('Event', 'Hangup'),
+                ('Channel', channel),
+                ('Uniqueid', uniqueid),
+                ('Cause', '16'),
+                ('Cause-txt', 'Normal Clearing'),
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5038)
+    parser.add_argument('--username', default='tts')
+    parser.add_argument('--secret', default='tts')
+    parser.add_argument('--outcome', choices=sorted(OUTCOME_REASONS), default='answered')
+    parser.add_argument('--reject', nargs='*', default=[], help='números rechazados al originar')
+    parser.add_argument('--unresponsive', nargs='*', default=[], help='números sin respuesta al originar')
+    parser.add_argument('--call-duration', type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    server = FakeAMIServer((args.host, args.port), args.username, args.secret,
+                           outcome=args.outcome, reject=args.reject, unresponsive=args.unresponsive,
+                           answer_delay=1.0, call_duration=args.call_duration)
+    logger.info(f"🧪 AMI de pruebas escuchando en {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
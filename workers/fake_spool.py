@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Spool de Asterisk de pruebas: toma los .call de outgoing y los archiva en
+outgoing_done como lo haría Asterisk al terminar la llamada
+
+No marca nada: cada llamada "dura" call_duration segundos y se archiva con
+el Status del resultado simulado. Sirve para ejecutar los workers sin
+Asterisk (CALL_ORIGINATOR=spool):
+
+    python workers/fake_spool.py --spool /tmp/tts/outgoing --done /tmp/tts/outgoing_done
+"""
+
+import argparse
+import heapq
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status que escribe Asterisk al archivar, según el resultado simulado
+OUTCOME_STATUSES = {
+    'answered': 'Completed',
+    'no_answer': 'Expired',
+    'failed': 'Failed',
+}
+
+
+class FakeSpool(threading.Thread):
+    """
+    Vigilar spool_dir y archivar cada .call en done_dir tras call_duration
+    segundos, con "Status: <status>" al final como Asterisk.
+
+    Ignora los archivos ocultos (escrituras atómicas a medio hacer), igual
+    que Asterisk. archived cuenta las llamadas ya archivadas.
+    """
+
+    def __init__(self, spool_dir, done_dir, outcome='answered', call_duration=0.0, interval=0.05):
+        super().__init__(name='fake-spool', daemon=True)
+        self.spool_dir = spool_dir
+        self.done_dir = done_dir
+        self.status = OUTCOME_STATUSES[outcome]
+        self.call_duration = call_duration
+        self.interval = interval
+        self.pending = []
+        self.taken = set()
+        self.archived = 0
+        self.stop_event = threading.Event()
+
+    def scan(self):
+        now = time.monotonic()
+        with os.scandir(self.spool_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.name.endswith('.call'):
+                    continue
+                if entry.name not in self.taken:
+                    self.taken.add(entry.name)
+                    heapq.heappush(self.pending, (now + self.call_duration, entry.name))
+
+        while self.pending and self.pending[0][0] <= now:
+            _, name = heapq.heappop(self.pending)
+            self.archive(name)
+
+    def archive(self, name):
+        source = os.path.join(self.spool_dir, name)
+        try:
+            with open(source, 'a', encoding='utf-8') as f:
+                f.write(f"Status: {self.status}\n")
+            os.replace(source, os.path.join(self.done_dir, name))
+        except FileNotFoundError:
+            pass
+        self.taken.discard(name)
+        self.archived += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"❌ Error en el spool de pruebas: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spool', required=True, help='directorio outgoing')
+    parser.add_argument('--done', required=True, help='directorio outgoing_done')
+    parser.add_argument('--outcome', choices=sorted(OUTCOME_STATUSES), default='answered')
+    parser.add_argument('--call-duration', type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    os.makedirs(args.spool, exist_ok=True)
+    os.makedirs(args.done, exist_ok=True)
+    spool = FakeSpool(args.spool, args.done, outcome=args.outcome, call_duration=args.call_duration)
+    logger.info(f"🧪 Spool de pruebas vigilando {args.spool}")
+    spool.start()
+    try:
+        while spool.is_alive():
+            spool.join(1)
+    except KeyboardInterrupt:
+        spool.stop_event.set()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Reintentos con backoff exponencial y cola de trabajos muertos (tts_dead)
+"""
+
+import json
+from datetime import datetime
+
+DEAD_QUEUE = 'tts_dead'
+
+
+class PermanentJobError(Exception):
+    """Error que reintentar no arregla (datos del trabajo inválidos)"""
+
+
+# Solo los errores de datos marcados como tales (JSON o campos inválidos,
+# idioma no soportado por gTTS, plantilla inexistente) son permanentes. El
+# resto (red, gTTS, Redis, Asterisk, espera de canal, y también un
+# ValueError o KeyError sin clasificar) se considera transitorio.
+PERMANENT_ERRORS = (PermanentJobError,)
+
+
+def is_permanent(error):
+    return isinstance(error, PERMANENT_ERRORS)
+
+
+def decode_job(body, required=()):
+    """
+    Mensaje de una etapa como dict, con los campos `required` como textos
+    no vacíos. Si no cumple lanza PermanentJobError: reintentarlo no lo
+    arregla.
+    """
+    try:
+        job_data = json.loads(body)
+    except ValueError as e:
+        raise PermanentJobError(f'Mensaje no es JSON válido: {e}') from e
+    if not isinstance(job_data, dict):
+        raise PermanentJobError('Mensaje no es un objeto JSON')
+
+    missing = [field for field in required if not isinstance(job_data.get(field), str) or not job_data[field]]
+    if missing:
+        raise PermanentJobError(f"Campos ausentes o inválidos: {', '.join(missing)}")
+    return job_data
+
+
+class RetryPolicy:
+    """
+    Decide qué pasa con un mensaje que falló.
+
+    Los reintentos no vuelven a la cola de inmediato: se publican en una cola
+    de espera "<cola>.retry.<N>s" con x-message-ttl, que al vencer los
+    devuelve a la cola original por dead-lettering. Las colas principales no
+    cambian sus argumentos. El retraso se dobla en cada intento hasta
+    max_delay, así que solo existe un puñado de colas de espera por cola.
+    Los errores permanentes y los que agotan max_attempts van a tts_dead.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=5, max_delay=600):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay_for(self, attempts, error):
+        """Segundos hasta el siguiente intento, o None si el mensaje va a tts_dead"""
+        if is_permanent(error) or attempts >= self.max_attempts:
+            return None
+        return int(min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+
+    @staticmethod
+    def retry_queue(queue, delay):
+        return f"{queue}.retry.{delay}s"
+
+    @staticmethod
+    def retry_arguments(queue, delay):
+        return {
+            'x-message-ttl': delay * 1000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': queue,
+        }
+
+    def route(self, queue, body, error):
+        """
+        Destino de un mensaje fallido de `queue`.
+
+        Devuelve (cola destino, cuerpo, cabeceras, retraso); retraso None
+        significa tts_dead. El cuerpo lleva el contador `attempts`.
+        """
+        try:
+            message = json.loads(body)
+        except ValueError:
+            message = None
+
+        if not isinstance(message, dict):
+            attempts, delay = 1, None
+        else:
+            attempts = int(message.get('attempts', 0)) + 1
+            delay = self.delay_for(attempts, error)
+            message['attempts'] = attempts
+            body = json.dumps(message)
+
+        if delay is not None:
+            return self.retry_queue(queue, delay), body, {}, delay
+
+        headers = {
+            'x-source-queue': queue,
+            'x-error': str(error)[:500],
+            'x-error-type': 'permanent' if is_permanent(error) or message is None else 'exhausted',
+            'x-attempts': attempts,
+            'x-dead-at': datetime.now().isoformat(),
+        }
+        return DEAD_QUEUE, body, headers, None
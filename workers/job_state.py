@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Transiciones de estado de trabajos con contadores e índices mantenidos en Redis
+"""
+
+import os
+import json
+import time
+
+# Claves compartidas con la API y el dashboard
+JOB_STATS_KEY = 'stats:jobs'            # hash estado final -> número de trabajos
+JOB_STATUS_KEY_PREFIX = 'jobs:status:'  # zset por estado en curso: job_id -> timestamp
+RECENT_JOBS_KEY = 'jobs:recent'         # zset job_id -> timestamp de creación
+WORKER_REGISTRY_KEY = 'workers:registry'  # zset worker_id -> último heartbeat
+EVENTS_CHANNEL = 'tts:events'           # pub/sub de cambios (dashboard, long-poll)
+WEBHOOK_QUEUE_KEY = 'webhooks:pending'  # lista de notificaciones HTTP por entregar
+
+# 'dialing' es la llamada entregada a Asterisk; el resultado de la llamada
+# (o 'completed' si no se siguen los resultados) cierra el trabajo
+TERMINAL_STATUSES = ('completed', 'failed', 'answered', 'busy', 'no_answer')
+ACTIVE_STATUSES = ('queued', 'processing', 'ready', 'retrying', 'dialing')
+
+# El historial completo queda en el consumidor de tts_results; Redis solo
+# necesita los trabajos en curso y los recientes
+JOB_TTL = int(os.getenv('JOB_TTL', 3600))
+WORKER_TTL = 300
+
+# Guarda el trabajo y mueve su contador del estado anterior al nuevo en una
+# sola operación atómica. Los estados en curso son un zset por estado
+# (KEYS[4..], job_id -> hora del cambio): el trabajo se quita de todos y se
+# añade al del estado nuevo, así un registro que expiró a mitad de camino no
+# deja cuentas fantasma; quien lee descarta lo más viejo que JOB_TTL. Los
+# estados finales se cuentan en el hash, restando el anterior si era final;
+# ese estado se lee del registro en Redis (no del mensaje), así una
+# reentrega no descuadra los contadores. El cambio se publica como evento con
+# el estado anterior incluido y, si el trabajo tiene callback_url y llega a
+# un estado final, se encola su notificación (una sola vez aunque el mensaje
+# se reentregue). Si se indica un estado esperado y el registro está en otro,
+# no se toca nada (varios workers pueden observar el mismo resultado de
+# llamada). Devuelve 1 si aplicó el cambio y 0 si no.
+TRANSITION_SCRIPT = """
+local previous = false
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, data = pcall(cjson.decode, current)
+    if ok and type(data) == 'table' and data['status'] then
+        previous = data['status']
+    end
+end
+if ARGV[7] ~= '' and previous ~= ARGV[7] then
+    return 0
+end
+redis.call('SETEX', KEYS[1], ARGV[2], ARGV[1])
+local active = false
+local previous_active = false
+for i = 4, #KEYS do
+    if KEYS[i] == ARGV[10] .. ARGV[3] then
+        active = KEYS[i]
+    else
+        redis.call('ZREM', KEYS[i], ARGV[8])
+    end
+    if previous and KEYS[i] == ARGV[10] .. previous then
+        previous_active = true
+    end
+end
+if active then
+    redis.call('ZADD', active, ARGV[9], ARGV[8])
+end
+if previous ~= ARGV[3] then
+    if previous and not previous_active then
+        redis.call('HINCRBY', KEYS[2], previous, -1)
+    end
+    if not active then
+        redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+    end
+end
+if ARGV[6] ~= '' and previous ~= ARGV[3] then
+    redis.call('RPUSH', KEYS[3], ARGV[6])
+end
+local event = cjson.decode(ARGV[4])
+event['previous'] = previous
+redis.call('PUBLISH', ARGV[5], cjson.encode(event))
+return 1
+"""
+
+
+def status_key(status):
+    return f"{JOB_STATUS_KEY_PREFIX}{status}"
+
+
+def transition_keys(job_id):
+    return [f"job:{job_id}", JOB_STATS_KEY, WEBHOOK_QUEUE_KEY] + [status_key(s) for s in ACTIVE_STATUSES]
+
+
+def job_event(job_data):
+    """Resumen de un trabajo para los eventos en vivo"""
+    return {
+        'type': 'job',
+        'job_id': job_data['job_id'],
+        'status': job_data['status'],
+        'text': job_data.get('text', '')[:100],
+        'phone_number': job_data.get('phone_number', ''),
+        'created_at': job_data.get('created_at', ''),
+        'worker_id': job_data.get('worker_id', ''),
+    }
+
+
+def webhook_notification(job_data):
+    """Notificación para callback_url, o None si el trabajo no la necesita"""
+    if not job_data.get('callback_url') or job_data['status'] not in TERMINAL_STATUSES:
+        return None
+    fields = ('job_id', 'status', 'phone_number', 'created_at', 'completed_at',
+              'failed_at', 'audio_file', 'error', 'worker_id', 'dialing_at',
+              'answered_at', 'ended_at', 'time_to_answer', 'call_duration')
+    return {
+        'callback_url': job_data['callback_url'],
+        'attempts': 0,
+        'body': {
+            'event': f"job.{job_data['status']}",
+            **{field: job_data[field] for field in fields if field in job_data}
+        }
+    }
+
+
+def transition_args(job_data, ttl=JOB_TTL, expected=''):
+    notification = webhook_notification(job_data)
+    return [
+        json.dumps(job_data),
+        ttl,
+        job_data['status'],
+        json.dumps(job_event(job_data)),
+        EVENTS_CHANNEL,
+        json.dumps(notification) if notification else '',
+        expected,
+        job_data['job_id'],
+        time.time(),
+        JOB_STATUS_KEY_PREFIX,
+    ]
+
+
+def queue_worker_state(pipe, worker_id, fields, clear=(), ttl=WORKER_TTL):
+    """
+    Encolar en un pipeline la actualización por campos del hash worker:<id>.
+
+    Renueva el TTL, el heartbeat en el registro y publica el cambio. Los
+    contadores se incrementan aparte con queue_worker_increment.
+    """
+    key = f"worker:{worker_id}"
+    pipe.hset(key, mapping=fields)
+    if clear:
+        pipe.hdel(key, *clear)
+    pipe.expire(key, ttl)
+    pipe.zadd(WORKER_REGISTRY_KEY, {worker_id: time.time()})
+    pipe.publish(EVENTS_CHANNEL, json.dumps({'type': 'worker', 'worker_id': worker_id, **fields}))
+    return pipe
+
+
+def queue_worker_increment(pipe, worker_id, field, amount=1):
+    """Encolar un incremento atómico de un contador del worker"""
+    pipe.hincrby(f"worker:{worker_id}", field, amount)
+    return pipe
+
+
+def queue_worker_removal(pipe, worker_id):
+    """Encolar en un pipeline la baja del worker"""
+    pipe.delete(f"worker:{worker_id}")
+    pipe.zrem(WORKER_REGISTRY_KEY, worker_id)
+    pipe.publish(EVENTS_CHANNEL, json.dumps({'type': 'worker_removed', 'worker_id': worker_id}))
+    return pipe
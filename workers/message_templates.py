@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Plantillas de mensajes: fragmentos estáticos pre-renderizados + variables
+"""
+
+import hashlib
+import json
+
+from audio_cache import normalize_text
+
+# Registro de plantillas (escrito por la API) y cola de pre-renderizado
+TEMPLATE_KEY_PREFIX = 'tts:template:'
+TEMPLATE_QUEUE = 'tts_templates'
+
+
+def template_key(template_id):
+    return f"{TEMPLATE_KEY_PREFIX}{template_id}"
+
+
+def decode_template(fields):
+    """Convertir el hash de una plantilla (bytes) en dict, o None si no existe"""
+    if not fields:
+        return None
+    template = {k.decode(): v.decode() for k, v in fields.items()}
+    template['segments'] = json.loads(template['segments'])
+    return template
+
+
+def is_speakable(text):
+    """Los fragmentos sin letras ni números (', ', '. ') no se sintetizan"""
+    return any(char.isalnum() for char in text)
+
+
+def fragment_name(text, language, engine, audio_format):
+    """
+    Nombre del sonido de un fragmento estático.
+
+    Depende solo del contenido, así que varias plantillas comparten los
+    fragmentos iguales y volver a registrar una plantilla con otro texto no
+    pisa los sonidos que usan llamadas ya encoladas.
+    """
+    raw = '\x1f'.join((normalize_text(text), language, engine, audio_format))
+    return f"tts_t_{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:20]}"
+
+
+def template_parts(template, variables):
+    """
+    Piezas a concatenar, en orden: ('static', texto) o ('variable', valor).
+
+    Las piezas sin nada que pronunciar se omiten.
+    """
+    parts = []
+    for segment in template['segments']:
+        if 'var' in segment:
+            kind, text = 'variable', str(variables.get(segment['var'], '')).strip()
+        else:
+            kind, text = 'static', segment['text'].strip()
+        if is_speakable(text):
+            parts.append((kind, text))
+    return parts
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Etapas del worker: síntesis (tts_calls/tts_priority -> tts_ready) y
+marcación (tts_ready -> Asterisk)
+"""
+
+import json
+
+# Trabajos con el audio ya generado, esperando un canal del troncal
+READY_QUEUE = 'tts_ready'
+READY_PRIORITY_QUEUE = 'tts_ready_priority'
+READY_QUEUES = (READY_PRIORITY_QUEUE, READY_QUEUE)
+SYNTH_QUEUES = ('tts_priority', 'tts_calls')
+
+# Contadores y segundos acumulados por etapa (tiempo medio de síntesis y
+# espera media con el audio listo hasta conseguir canal), para el dashboard
+PIPELINE_STATS_KEY = 'stats:pipeline'
+# Segundos entre consultas de la profundidad de tts_ready (adelanto de síntesis)
+READY_DEPTH_INTERVAL = 0.5
+
+# Campos que cada etapa necesita en el mensaje (textos no vacíos)
+TEMPLATE_FIELDS = ('template_id',)
+SYNTH_FIELDS = ('job_id', 'text')
+DIAL_FIELDS = ('job_id', 'phone_number')
+
+# WORKER_ROLE: 'all' ejecuta las dos etapas, cada una con su concurrencia
+WORKER_ROLES = {
+    'all': ('synth', 'dial'),
+    'synth': ('synth',),
+    'dial': ('dial',),
+}
+
+
+def synthesis_queue(job_data):
+    return 'tts_priority' if job_data.get('priority') == 'high' else 'tts_calls'
+
+
+def ready_queue(job_data):
+    return READY_PRIORITY_QUEUE if job_data.get('priority') == 'high' else READY_QUEUE
+
+
+def retry_source(queue, body):
+    """
+    Cola a la que vuelve un mensaje fallido.
+
+    Un fallo al marcar vuelve a la síntesis: el sonido se soltó al fallar y
+    el reintento lo toma del cache o lo genera de nuevo.
+    """
+    if queue not in READY_QUEUES:
+        return queue
+    try:
+        return synthesis_queue(json.loads(body))
+    except (ValueError, AttributeError):
+        return queue
+
+
+class Stage:
+    """
+    Una etapa del worker: colas de entrada, concurrencia y manejador propios.
+
+    handler(job_data) devuelve None o (cola, job_data) para reenviar el
+    trabajo a la etapa siguiente; el reenvío y la confirmación del mensaje
+    de entrada se hacen juntos al terminar. Un mensaje sin los campos
+    `required` va directo a tts_dead. channel, executor y los
+    delivery_tags en curso (`scheduled`) los asigna el worker.
+    """
+
+    def __init__(self, name, queues, handler, concurrency, scheduler=None, required=()):
+        self.name = name
+        self.queues = queues
+        self.handler = handler
+        self.required = required
+        self.concurrency = max(concurrency, 1)
+        self.scheduler = scheduler
+        self.channel = None
+        self.executor = None
+        self.scheduled = set()
+
+    @property
+    def active(self):
+        return len(self.scheduled)
+
+    def has_slot(self):
+        return len(self.scheduled) < self.concurrency
+
+
+def queue_stage_sample(pipe, stage, seconds):
+    """Encolar en un pipeline un trabajo terminado por la etapa y sus segundos"""
+    pipe.hincrby(PIPELINE_STATS_KEY, f'{stage}_jobs', 1)
+    if seconds is not None:
+        pipe.hincrbyfloat(PIPELINE_STATS_KEY, f'{stage}_seconds_total', seconds)
+    return pipe
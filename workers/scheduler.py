@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Planificador de prioridad con límite de inanición para los workers
+"""
+
+
+class PriorityScheduler:
+    """
+    Decide de qué cola tomar el siguiente trabajo.
+
+    Siempre se prefiere la cola de prioridad, salvo que se hayan tomado
+    `burst` trabajos prioritarios seguidos mientras había trabajos normales
+    esperando: entonces pasa uno normal. Un trabajo normal espera como mucho
+    `burst` trabajos prioritarios, y uno prioritario como mucho un trabajo
+    normal, sin importar lo profunda que sea la cola normal.
+
+    Los workers solo piden un mensaje cuando tienen un hueco libre, así que
+    nunca queda un trabajo prioritario detrás de normales ya recibidos.
+    """
+
+    def __init__(self, high_queue='tts_priority', normal_queue='tts_calls', burst=10):
+        self.high_queue = high_queue
+        self.normal_queue = normal_queue
+        self.burst = max(burst, 1)
+        self.streak = 0
+
+    def order(self):
+        """Colas a consultar, en orden"""
+        if self.streak >= self.burst:
+            return [self.normal_queue, self.high_queue]
+        return [self.high_queue, self.normal_queue]
+
+    def record(self, queue, found):
+        """Registrar el resultado de consultar una cola"""
+        if queue == self.high_queue:
+            if found:
+                self.streak += 1
+        else:
+            # Se atendió un normal, o no había ninguno esperando
+            self.streak = 0
+
+    def next_message(self, channel):
+        """
+        Tomar el siguiente mensaje con basic_get (pika.BlockingChannel).
+
+        Devuelve (cola, method, properties, body) o (None, None, None, None).
+        """
+        for queue in self.order():
+            method, properties, body = channel.basic_get(queue)
+            self.record(queue, method is not None)
+            if method is not None:
+                return queue, method, properties, body
+        return None, None, None, None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Ciclo de vida de los sonidos generados en el directorio de Asterisk
+
+Referencias por llamada pendiente, borrado al terminar la llamada y barrido
+incremental de huérfanos desde un índice en Redis (sin listar el directorio).
+
+Uso (una sola vez, para indexar sonidos anteriores al índice):
+    python workers/sound_files.py --backfill
+"""
+
+import argparse
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sonidos de un solo trabajo (tts_<id>): audio_name -> hora de creación.
+# Los del cache (tts_c_*) los acota AudioCache y los fragmentos de
+# plantilla (tts_t_*) son permanentes; ninguno entra en este índice.
+SOUND_FILES_KEY = 'sounds:files'
+# Llamadas que usan cada sonido: job_id -> vencimiento de la referencia
+SOUND_REFS_PREFIX = 'sounds:refs:'
+JOB_SOUND_PREFIX = 'tts_'
+SHARED_SOUND_PREFIXES = ('tts_c_', 'tts_t_')
+
+# KEYS: referencias del sonido, índice de archivos; ARGV: job_id (o ''),
+# ahora, audio_name. Quita la referencia del trabajo y las vencidas; si no
+# queda ninguna, saca el sonido del índice y devuelve 1: solo quien lo saca
+# borra el archivo, aunque varios workers vean el mismo fin de llamada.
+# Un sonido aún referenciado pasa al final del índice para que el barrido
+# no se atasque en él.
+RELEASE_SCRIPT = """
+if ARGV[1] ~= '' then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) > 0 then
+    redis.call('ZADD', KEYS[2], 'XX', ARGV[2], ARGV[3])
+    return 0
+end
+return redis.call('ZREM', KEYS[2], ARGV[3])
+"""
+
+
+def refs_key(audio_name):
+    return f'{SOUND_REFS_PREFIX}{audio_name}'
+
+
+def is_job_sound(audio_name):
+    return audio_name.startswith(JOB_SOUND_PREFIX) and not audio_name.startswith(SHARED_SOUND_PREFIXES)
+
+
+class SoundFileManager:
+    """
+    Referencias de los sonidos a las llamadas que los reproducen.
+
+    Cada trabajo toma una referencia sobre su sonido en cuanto lo tiene y la
+    suelta cuando Asterisk termina la llamada (con sus reintentos) o cuando
+    el intento falla. Un sonido propio del trabajo se borra al soltar la
+    última referencia; uno del cache solo queda protegido de la expulsión
+    LRU mientras tenga referencias. Las referencias vencen tras `lease`
+    segundos por si el fin de la llamada se pierde, y sweep() borra por
+    lotes los sonidos indexados con más de `orphan_age` segundos sin
+    referencias (worker caído entre la síntesis y la llamada, por ejemplo).
+    """
+
+    def __init__(self, redis_client, sounds_dir, audio_format='gsm', lease=3600, orphan_age=3600):
+        self.redis = redis_client
+        self.sounds_dir = sounds_dir
+        self.audio_format = audio_format
+        self.lease = lease
+        self.orphan_age = orphan_age
+        self._release = self.redis.register_script(RELEASE_SCRIPT)
+
+    def path_for(self, audio_name):
+        return os.path.join(self.sounds_dir, f'{audio_name}.{self.audio_format}')
+
+    def track(self, audio_name):
+        """Indexar un sonido de un solo trabajo antes de escribirlo"""
+        self.redis.zadd(SOUND_FILES_KEY, {audio_name: time.time()}, nx=True)
+
+    def acquire(self, audio_name, job_id):
+        """Referencia del trabajo sobre su sonido hasta que termine la llamada"""
+        expires = time.time() + self.lease
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(refs_key(audio_name), {job_id: expires})
+        pipe.expire(refs_key(audio_name), self.lease)
+        pipe.execute()
+
+    def release(self, audio_name, job_id=''):
+        """Soltar la referencia; borra el sonido si era la última. Devuelve si se borró"""
+        claimed = self._release(
+            keys=[refs_key(audio_name), SOUND_FILES_KEY],
+            args=[job_id, time.time(), audio_name]
+        )
+        if not claimed:
+            return False
+        self.remove(audio_name)
+        return True
+
+    def remove(self, audio_name):
+        try:
+            os.remove(self.path_for(audio_name))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, batch=100):
+        """Borrar un lote de sonidos huérfanos (los más antiguos del índice)"""
+        candidates = self.redis.zrangebyscore(
+            SOUND_FILES_KEY, 0, time.time() - self.orphan_age, start=0, num=batch
+        )
+        removed = 0
+        for audio_name in candidates:
+            audio_name = audio_name.decode() if isinstance(audio_name, bytes) else audio_name
+            if self.release(audio_name):
+                removed += 1
+        if removed:
+            logger.info(f"🧹 Sonidos huérfanos borrados: {removed}")
+        return removed
+
+    def backfill(self, batch=1000):
+        """
+        Indexar los sonidos de trabajos que ya estaban en el directorio.
+
+        Recorre el directorio una sola vez como iterador (sin cargar el
+        listado) y los indexa con su mtime: los antiguos los borra el barrido.
+        """
+        indexed = 0
+        pipe = self.redis.pipeline(transaction=False)
+        suffix = f'.{self.audio_format}'
+        with os.scandir(self.sounds_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffix):
+                    continue
+                audio_name = entry.name[:-len(suffix)]
+                if not is_job_sound(audio_name):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                pipe.zadd(SOUND_FILES_KEY, {audio_name: mtime}, nx=True)
+                indexed += 1
+                if indexed % batch == 0:
+                    pipe.execute()
+        pipe.execute()
+        logger.info(f"📇 Sonidos indexados: {indexed}")
+        return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backfill', action='store_true', help='indexar los sonidos existentes')
+    parser.add_argument('--sweep', action='store_true', help='borrar ahora todos los huérfanos')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    import redis
+    from tts_worker import (
+        REDIS_URL, ASTERISK_SOUNDS_DIR, AUDIO_FORMAT, SOUND_REF_LEASE, SOUND_ORPHAN_AGE,
+    )
+
+    manager = SoundFileManager(
+        redis.from_url(REDIS_URL), ASTERISK_SOUNDS_DIR, AUDIO_FORMAT,
+        lease=SOUND_REF_LEASE, orphan_age=SOUND_ORPHAN_AGE
+    )
+    if args.backfill:
+        manager.backfill()
+    if args.sweep:
+        while manager.sweep(batch=1000):
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Motores de síntesis TTS (gTTS, espeak-ng local, falso) y conmutación por
+latencia y tasa de errores
+"""
+
+import hashlib
+import io
+import math
+import random
+import shutil
+import subprocess
+import struct
+import threading
+import time
+import wave
+from collections import deque
+import logging
+
+from audio_pipeline import synthesize_mp3
+from job_retry import PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+
+class GTTSEngine:
+    """Google Translate TTS (HTTP); cada petición se corta a `timeout` segundos"""
+
+    name = 'gtts'
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+
+    def available(self):
+        return True
+
+    def synthesize(self, text, language):
+        """Audio del texto: (bytes, formato de origen)"""
+        return synthesize_mp3(text, language, timeout=self.timeout), 'mp3'
+
+
+class EspeakEngine:
+    """
+    espeak-ng local, sin red.
+
+    Cada síntesis es un proceso corto que escribe WAV por stdout; un
+    semáforo acota los procesos simultáneos por worker a `concurrency`.
+    """
+
+    name = 'espeak'
+
+    def __init__(self, binary='espeak-ng', concurrency=4, timeout=10.0):
+        self.binary = binary
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max(concurrency, 1))
+
+    def available(self):
+        return shutil.which(self.binary) is not None
+
+    def synthesize(self, text, language):
+        with self.slots:
+            result = subprocess.run(
+                [self.binary, '-v', (language or 'es').lower(), '--stdout'],
+                input=text.encode('utf-8'),
+                capture_output=True,
+                timeout=self.timeout,
+                check=True
+            )
+        return result.stdout, 'wav'
+
+
+class FakeEngine:
+    """
+    Motor determinista para pruebas y benchmarks, sin red ni binarios.
+
+    El mismo (texto, idioma) produce siempre el mismo WAV: un tono cuya
+    frecuencia sale del hash del texto y cuya duración crece con su
+    longitud. `latency` simula el tiempo de síntesis y `error_rate` la
+    fracción de fallos (con semilla fija).
+    """
+
+    name = 'fake'
+
+    SAMPLE_RATE = 8000
+    SECONDS_PER_CHAR = 0.06
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def available(self):
+        return True
+
+    def synthesize(self, text, language):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if failed:
+            raise ConnectionError('Fallo simulado del motor falso')
+
+        digest = hashlib.sha256(f'{language}\n{text}'.encode('utf-8')).digest()
+        frequency = 300 + digest[0] * 2
+        samples = max(int(len(text) * self.SECONDS_PER_CHAR * self.SAMPLE_RATE), self.SAMPLE_RATE // 10)
+        frames = b''.join(
+            struct.pack('<h', int(8000 * math.sin(2 * math.pi * frequency * i / self.SAMPLE_RATE)))
+            for i in range(samples)
+        )
+
+        output = io.BytesIO()
+        with wave.open(output, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(frames)
+        return output.getvalue(), 'wav'
+
+
+ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+    FakeEngine.name: FakeEngine,
+}
+
+
+class EngineHealth:
+    """Latencias y errores de las últimas `window` síntesis de un motor"""
+
+    def __init__(self, window=50):
+        self.samples = deque(maxlen=window)
+        self.demoted_until = 0.0
+
+    def record(self, seconds, ok):
+        self.samples.append((seconds, ok))
+
+    def p95(self):
+        latencies = sorted(seconds for seconds, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def snapshot(self):
+        p95 = self.p95()
+        return {
+            'samples': len(self.samples),
+            'p95': round(p95, 3) if p95 is not None else None,
+            'error_rate': round(self.error_rate(), 3),
+            'demoted': self.demoted_until > time.monotonic(),
+        }
+
+
+class EngineRouter:
+    """
+    Sintetizar con el primer motor sano de la lista.
+
+    Un motor con al menos `min_samples` síntesis recientes cuyo p95 supera
+    `max_p95` segundos o cuya tasa de errores supera `max_error_rate` queda
+    relegado `cooldown` segundos: mientras tanto se usa el siguiente. Al
+    vencer vuelve a probarse con sus muestras a cero. Si un motor falla, la
+    misma síntesis se reintenta con el siguiente, así que una caída del
+    motor principal no llega a los trabajos. Los errores de datos
+    (PermanentJobError: idioma no soportado, por ejemplo) no cuentan como
+    fallo del motor y no se reintentan.
+    """
+
+    def __init__(self, engines, max_p95=5.0, max_error_rate=0.5, min_samples=10,
+                 window=50, cooldown=60):
+        if not engines:
+            raise ValueError('Se necesita al menos un motor TTS')
+        self.engines = engines
+        self.max_p95 = max_p95
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.health = {engine.name: EngineHealth(window) for engine in engines}
+        self.lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.engines[0].name
+
+    def candidates(self):
+        """Motores en orden: primero los sanos, al final los relegados"""
+        now = time.monotonic()
+        with self.lock:
+            healthy = [e for e in self.engines if self.health[e.name].demoted_until <= now]
+            demoted = [e for e in self.engines if self.health[e.name].demoted_until > now]
+        return healthy + demoted
+
+    def active(self):
+        """Motor que recibirá la próxima síntesis"""
+        return self.candidates()[0].name
+
+    def record(self, engine, seconds, ok):
+        health = self.health[engine.name]
+        with self.lock:
+            if health.demoted_until and health.demoted_until <= time.monotonic():
+                # Fin del castigo: vuelve a medirse desde cero
+                health.samples.clear()
+                health.demoted_until = 0.0
+            health.record(seconds, ok)
+            if health.demoted_until or len(health.samples) < self.min_samples:
+                return
+            p95, error_rate = health.p95(), health.error_rate()
+            if (p95 is not None and p95 > self.max_p95) or error_rate > self.max_error_rate:
+                health.demoted_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"⚠️ Motor TTS {engine.name} relegado {self.cooldown}s "
+                    f"(p95: {p95}s, errores: {error_rate:.0%})"
+                )
+
+    def synthesize(self, text, language):
+        """Audio del texto: (motor, bytes, formato de origen)"""
+        last_error = None
+        for engine in self.candidates():
+            started = time.monotonic()
+            try:
+                audio_bytes, source_format = engine.synthesize(text, language)
+            except PermanentJobError:
+                raise
+            except Exception as e:
+                self.record(engine, time.monotonic() - started, ok=False)
+                logger.warning(f"⚠️ Motor TTS {engine.name} falló: {e}")
+                last_error = e
+                continue
+            self.record(engine, time.monotonic() - started, ok=True)
+            return engine.name, audio_bytes, source_format
+        raise last_error
+
+    def stats(self):
+        """Salud de cada motor, para el registro del worker"""
+        with self.lock:
+            return {name: health.snapshot() for name, health in self.health.items()}
+
+
+def build_router(names, timeout=10.0, local_concurrency=4, fake_latency=0.0, fake_error_rate=0.0,
+                 **kwargs):
+    """Router con los motores disponibles de `names`, en ese orden"""
+    engines = []
+    for name in names:
+        if name not in ENGINES:
+            raise ValueError(f"Motor TTS desconocido: {name} (opciones: {', '.join(ENGINES)})")
+        if name == 'gtts':
+            engine = GTTSEngine(timeout=timeout)
+        elif name == 'espeak':
+            engine = EspeakEngine(concurrency=local_concurrency, timeout=timeout)
+        else:
+            engine = FakeEngine(latency=fake_latency, error_rate=fake_error_rate)
+        if not engine.available():
+            logger.warning(f"⚠️ Motor TTS {name} no disponible en este contenedor, se omite")
+            continue
+        engines.append(engine)
+    return EngineRouter(engines, **kwargs)
@@ -0,0 +1,984 @@
+#!/usr/bin/env python3
+"""
+Worker asyncio para procesar llamadas TTS desde RabbitMQ
+
+Alternativa a TTSWorker (pika.BlockingConnection): un solo event loop mantiene
+cientos de trabajos en vuelo. Usa las mismas colas, los mismos registros
+job:* / worker:* en Redis y las mismas variables de entorno, así que ambos
+motores pueden convivir consumiendo de las mismas colas.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import logging
+
+import aio_pika
+import redis
+import redis.asyncio as aioredis
+
+from audio_cache import AudioCache
+from audio_pipeline import (
+    transcode_for_asterisk, atomic_write, resolve_owner,
+    concatenate_audio, read_file,
+)
+from job_state import (
+    TRANSITION_SCRIPT, transition_keys, transition_args,
+    queue_worker_state, queue_worker_increment, queue_worker_removal,
+)
+from message_templates import (
+    TEMPLATE_QUEUE, template_key, decode_template, template_parts,
+)
+from tts_worker import (
+    RABBITMQ_URL, REDIS_URL, WORKER_ID, WORKER_CONCURRENCY,
+    ASTERISK_SOUNDS_DIR, ASTERISK_USER,
+    TTS_ENGINES, AUDIO_FORMAT,
+    TTS_CACHE_ENABLED, TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_AGE, TTS_CACHE_MIN_IDLE,
+    WORKER_HEARTBEAT_INTERVAL, build_originator, build_engines, text_chunks, fragment_path,
+    WORKER_SCHEDULER, WORKER_PRIORITY_BURST, WORKER_POLL_INTERVAL,
+    ASTERISK_DONE_DIR, SIP_TRUNK, CALL_ADMISSION_ENABLED, TRUNK_MAX_CHANNELS, TRUNK_MAX_CPS,
+    CALL_SLOT_LEASE, CALL_ADMISSION_TIMEOUT, CALL_OUTCOME_TRACKING,
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    SOUND_GC_ENABLED, SOUND_REF_LEASE, SOUND_ORPHAN_AGE, SOUND_SWEEP_BATCH,
+    WORKER_ROLE, SYNTH_CONCURRENCY, DIAL_CONCURRENCY, PIPELINE_LOOKAHEAD,
+    WORKER_METRICS_PORT, CALL_DONE_SCAN_INTERVAL,
+)
+from scheduler import PriorityScheduler
+from call_admission import AdmissionController, CallDoneWatcher
+from call_outcomes import CallOutcomeTracker, seconds_between
+from job_retry import DEAD_QUEUE, PermanentJobError, RetryPolicy, decode_job, is_permanent
+from sound_files import SoundFileManager
+from worker_metrics import (
+    STEP_SECONDS, ENGINE_SECONDS, STAGE_SECONDS, REDIS_SECONDS, RABBITMQ_SECONDS, CACHE_LOOKUPS,
+    observe_queue_wait, start_metrics_server,
+)
+from pipeline import (
+    READY_QUEUES, READY_QUEUE, READY_PRIORITY_QUEUE, SYNTH_QUEUES, READY_DEPTH_INTERVAL,
+    WORKER_ROLES, TEMPLATE_FIELDS, SYNTH_FIELDS, DIAL_FIELDS,
+    Stage, ready_queue, retry_source, queue_stage_sample,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hilos para llamadas bloqueantes de red (gTTS, cache) y para transcodificar
+WORKER_IO_THREADS = int(os.getenv('WORKER_IO_THREADS', WORKER_CONCURRENCY))
+WORKER_CPU_THREADS = int(os.getenv('WORKER_CPU_THREADS', os.cpu_count() or 1))
+
+
+class AsyncTTSWorker:
+    def __init__(self):
+        self.worker_id = WORKER_ID
+        self.redis = None
+        self.connection = None
+        self.channel = None
+        self.audio_cache = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.engines = build_engines()
+        self.spool_owner = resolve_owner(ASTERISK_USER)
+        self.active_jobs = []
+        self.tasks = set()
+        self.heartbeat_task = None
+        self.admission = None
+        self.done_watcher = None
+        self.originator = None
+        self.outcomes = None
+        self.sound_files = None
+        self.loop = None
+        # Etapas (síntesis, marcación, plantillas), cada una con su canal y
+        # sus huecos; colas declaradas en el canal de cada etapa
+        self.stages = []
+        self.stage_queues = {}
+        self.ready_depth_value = 0
+        self.ready_depth_at = 0.0
+        self.retry_policy = RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+        self.retry_queues = set()
+        # Generaciones en curso por clave de cache (una sola síntesis por texto)
+        self.inflight = {}
+        self.stop_event = asyncio.Event()
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=WORKER_IO_THREADS, thread_name_prefix=f'{self.worker_id}-io'
+        )
+        self.cpu_executor = ThreadPoolExecutor(
+            max_workers=WORKER_CPU_THREADS, thread_name_prefix=f'{self.worker_id}-cpu'
+        )
+
+    async def run_io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, fn, *args)
+
+    async def run_cpu(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_executor, fn, *args)
+
+    async def connect(self):
+        """Conectar a RabbitMQ y Redis"""
+        try:
+            # Conectar a Redis
+            self.redis = aioredis.from_url(REDIS_URL)
+            await self.redis.ping()
+            self.job_transition = self.redis.register_script(TRANSITION_SCRIPT)
+            logger.info(f"✅ Worker {self.worker_id} conectado a Redis")
+
+            # Cliente síncrono para los componentes compartidos con TTSWorker;
+            # sus llamadas se ejecutan en el pool de E/S
+            sync_redis = redis.from_url(REDIS_URL)
+
+            if TTS_CACHE_ENABLED:
+                self.audio_cache = AudioCache(
+                    sync_redis,
+                    ASTERISK_SOUNDS_DIR,
+                    max_bytes=TTS_CACHE_MAX_BYTES,
+                    max_age=TTS_CACHE_MAX_AGE,
+                    min_idle=TTS_CACHE_MIN_IDLE
+                )
+
+            if SOUND_GC_ENABLED:
+                self.sound_files = SoundFileManager(
+                    sync_redis,
+                    ASTERISK_SOUNDS_DIR,
+                    AUDIO_FORMAT,
+                    lease=SOUND_REF_LEASE,
+                    orphan_age=SOUND_ORPHAN_AGE
+                )
+
+            if CALL_ADMISSION_ENABLED:
+                self.admission = AdmissionController(
+                    sync_redis,
+                    SIP_TRUNK,
+                    max_channels=TRUNK_MAX_CHANNELS,
+                    cps=TRUNK_MAX_CPS,
+                    lease=CALL_SLOT_LEASE
+                )
+
+            # Los resultados de llamada llegan en hilos (vigilante o lector AMI)
+            self.loop = asyncio.get_running_loop()
+            if CALL_OUTCOME_TRACKING:
+                self.outcomes = CallOutcomeTracker(sync_redis, on_result=self.publish_result_threadsafe)
+
+            # Con AMI el fin de la llamada llega por eventos; con el spool,
+            # por los .call archivados en outgoing_done
+            self.originator = build_originator(self.call_done, self.call_answered, self.spool_owner)
+            await self.run_io(self.originator.start)
+            logger.info(f"✅ Originación de llamadas: {self.originator.name}")
+            needs_done = (self.admission is not None or self.outcomes is not None
+                          or self.sound_files is not None)
+            if needs_done and self.originator.name == 'spool':
+                self.done_watcher = CallDoneWatcher(
+                    ASTERISK_DONE_DIR, self.call_done,
+                    interval=CALL_DONE_SCAN_INTERVAL, lookback=CALL_SLOT_LEASE
+                )
+                self.done_watcher.start()
+
+            # Conectar a RabbitMQ
+            self.connection = await aio_pika.connect_robust(RABBITMQ_URL)
+            self.channel = await self.connection.channel()
+
+            # Declarar colas
+            for name in ('tts_calls', 'tts_priority', 'tts_results', TEMPLATE_QUEUE, DEAD_QUEUE) + READY_QUEUES:
+                await self.channel.declare_queue(name, durable=True)
+
+            # Cada etapa con su canal: el prefetch limita su concurrencia
+            self.stages = self.build_stages()
+            for stage in self.stages:
+                stage.channel = await self.connection.channel()
+                await stage.channel.set_qos(prefetch_count=stage.concurrency)
+                self.stage_queues[stage.name] = {
+                    name: await stage.channel.declare_queue(name, durable=True)
+                    for name in stage.queues
+                }
+
+            logger.info(f"✅ Worker {self.worker_id} conectado a RabbitMQ "
+                        f"(etapas: {', '.join(stage.name for stage in self.stages)})")
+
+            # Registrar worker en Redis
+            await self.register_worker()
+
+        except Exception as e:
+            logger.error(f"❌ Error conectando worker {self.worker_id}: {e}")
+            raise
+
+    def build_stages(self):
+        """Etapas según WORKER_ROLE; las plantillas las pre-renderiza quien sintetiza"""
+        if WORKER_ROLE not in WORKER_ROLES:
+            raise ValueError(f"WORKER_ROLE inválido: {WORKER_ROLE} (opciones: {', '.join(WORKER_ROLES)})")
+        roles = WORKER_ROLES[WORKER_ROLE]
+        stages = []
+        if 'synth' in roles:
+            stages.append(Stage(
+                'templates', (TEMPLATE_QUEUE,), self.template_job, 1, required=TEMPLATE_FIELDS
+            ))
+            stages.append(Stage(
+                'synth', SYNTH_QUEUES, self.synthesize_job, SYNTH_CONCURRENCY,
+                PriorityScheduler(burst=WORKER_PRIORITY_BURST), required=SYNTH_FIELDS
+            ))
+        if 'dial' in roles:
+            stages.append(Stage(
+                'dial', READY_QUEUES, self.dial_job, DIAL_CONCURRENCY,
+                PriorityScheduler(READY_PRIORITY_QUEUE, READY_QUEUE, burst=WORKER_PRIORITY_BURST),
+                required=DIAL_FIELDS
+            ))
+        return stages
+
+    async def register_worker(self):
+        """Registrar worker en Redis e iniciar su heartbeat"""
+        fields = {
+            'worker_id': self.worker_id,
+            'engine': 'asyncio',
+            'role': WORKER_ROLE,
+            'status': 'idle',
+            'started_at': datetime.now().isoformat(),
+            'processed_jobs': 0,
+            'synthesized_jobs': 0,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'active_jobs': 0,
+            'last_heartbeat': datetime.now().isoformat()
+        }
+        pipe = self.redis.pipeline()
+        pipe.delete(f"worker:{self.worker_id}")
+        await queue_worker_state(pipe, self.worker_id, fields).execute()
+
+        self.heartbeat_task = asyncio.create_task(self.heartbeat_loop())
+        logger.info(f"📝 Worker {self.worker_id} registrado")
+
+    async def heartbeat_loop(self):
+        """Refrescar el registro del worker aunque un trabajo tarde mucho"""
+        while True:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+            await self.update_worker_status()
+            await self.sweep_sounds()
+
+    async def sweep_sounds(self):
+        """Borrar un lote de sonidos huérfanos (entre todos los workers)"""
+        if self.sound_files is None:
+            return
+        try:
+            await self.run_io(self.sound_files.sweep, SOUND_SWEEP_BATCH)
+        except Exception as e:
+            logger.error(f"❌ Error barriendo sonidos huérfanos: {e}")
+
+    async def update_worker_status(self, pipe=None):
+        """
+        Actualizar estado del worker (campos del hash, sin leer el registro).
+
+        Si se pasa un pipeline, la actualización se encola en él y la ejecuta
+        quien lo creó, junto con el cambio de estado del trabajo.
+        """
+        try:
+            current_job = self.active_jobs[-1] if self.active_jobs else None
+            fields = {
+                'status': 'processing' if current_job else 'idle',
+                'last_heartbeat': datetime.now().isoformat(),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'active_jobs': len(self.active_jobs),
+                'tts_engine': self.engines.active()
+            }
+            for stage in self.stages:
+                fields[f'{stage.name}_active'] = stage.active
+            if current_job:
+                fields['current_job'] = current_job
+
+            own_pipe = pipe is None
+            if own_pipe:
+                pipe = self.redis.pipeline()
+            queue_worker_state(
+                pipe, self.worker_id, fields,
+                clear=() if current_job else ('current_job',)
+            )
+            if own_pipe:
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"❌ Error actualizando estado worker: {e}")
+
+    async def execute(self, pipe):
+        """Ejecutar el pipeline de estado de un trabajo midiendo la llamada a Redis"""
+        with REDIS_SECONDS.labels('job_state').time():
+            return await pipe.execute()
+
+    async def save_job(self, job_data, pipe=None):
+        """Guardar trabajo y actualizar contadores por estado en una sola operación"""
+        await self.job_transition(
+            keys=transition_keys(job_data['job_id']),
+            args=transition_args(job_data),
+            client=pipe
+        )
+
+    async def job_started(self, job_id, pipe=None):
+        """Registrar inicio de un trabajo y marcar el worker como ocupado"""
+        self.active_jobs.append(job_id)
+        await self.update_worker_status(pipe)
+
+    async def job_finished(self, job_id, pipe=None):
+        """Registrar fin de un trabajo y volver a idle si no quedan otros en curso"""
+        if job_id in self.active_jobs:
+            self.active_jobs.remove(job_id)
+        await self.update_worker_status(pipe)
+
+    async def generate_tts_audio(self, text, language='es'):
+        """Generar audio TTS (reutilizando el cache si está habilitado)"""
+        chunks = text_chunks(text)
+        if len(chunks) > 1:
+            produce = functools.partial(self.synthesize_chunked, chunks)
+        else:
+            produce = self.synthesize_audio
+
+        if self.audio_cache is None:
+            return await produce(text, language, await self.job_sound_name())
+        return await self.cached_audio(text, language, produce)
+
+    async def job_sound_name(self):
+        """Nombre para el sonido de un solo trabajo, indexado antes de escribirlo"""
+        audio_name = f'tts_{os.urandom(4).hex()}'
+        if self.sound_files is not None:
+            await self.run_io(self.sound_files.track, audio_name)
+        return audio_name
+
+    def release_sound(self, audio_filename, job_id):
+        """Soltar la referencia del trabajo (borra el sonido si nadie más lo usa); bloqueante"""
+        try:
+            if self.sound_files.release(audio_filename, job_id):
+                logger.info(f"🗑️ Sonido {audio_filename} borrado")
+        except Exception as e:
+            # La referencia vence sola y el barrido borra el sonido
+            logger.error(f"❌ Error liberando sonido {audio_filename}: {e}")
+
+    async def cached_audio(self, text, language, produce, used=None):
+        """
+        Buscar el audio en cache o generarlo con
+        produce(text, language, audio_name, used).
+
+        La clave lleva el motor que sintetizaría ahora (el primero sano), como
+        en el worker síncrono; `used` recoge los motores de los que sale el audio.
+        """
+        engine = self.engines.active()
+        cache_key = self.audio_cache.make_key(text, language, engine, AUDIO_FORMAT)
+        with REDIS_SECONDS.labels('cache_lookup').time():
+            audio_name = await self.run_io(self.audio_cache.lookup, cache_key)
+        if audio_name:
+            self.cache_hits += 1
+            CACHE_LOOKUPS.labels('hit').inc()
+            logger.info(f"♻️ Audio TTS desde cache: {audio_name}")
+            if used is not None:
+                used.add(engine)
+            return audio_name
+
+        # Trabajos concurrentes con el mismo texto esperan la misma síntesis
+        pending = self.inflight.get(cache_key)
+        if pending is not None:
+            self.cache_hits += 1
+            CACHE_LOOKUPS.labels('hit').inc()
+        else:
+            self.cache_misses += 1
+            CACHE_LOOKUPS.labels('miss').inc()
+            pending = asyncio.ensure_future(self.synthesize_cached(text, language, cache_key, engine, produce))
+            self.inflight[cache_key] = pending
+            pending.add_done_callback(lambda _: self.inflight.pop(cache_key, None))
+
+        audio_name, produced = await asyncio.shield(pending)
+        if used is not None:
+            used.update(produced)
+        return audio_name
+
+    async def synthesize_cached(self, text, language, cache_key, engine, produce):
+        produced = set()
+        audio_name = await produce(text, language, self.audio_cache.filename_for(cache_key), produced)
+        return await self.store_audio(cache_key, engine, produced, text, language, audio_name), produced
+
+    async def store_audio(self, cache_key, engine, produced, text, language, audio_name):
+        """Guardar en cache el audio recién generado con la clave del motor que lo produjo"""
+        if produced and produced != {engine}:
+            source = self.audio_cache.path_for(audio_name, AUDIO_FORMAT)
+            if len(produced) > 1:
+                # Partes de motores distintos: sonido de un solo trabajo, sin cache
+                job_sound = await self.job_sound_name()
+                await self.run_io(os.replace, source, self.audio_cache.path_for(job_sound, AUDIO_FORMAT))
+                return job_sound
+            cache_key = self.audio_cache.make_key(text, language, next(iter(produced)), AUDIO_FORMAT)
+            audio_name = self.audio_cache.filename_for(cache_key)
+            await self.run_io(os.replace, source, self.audio_cache.path_for(audio_name, AUDIO_FORMAT))
+        await self.run_io(self.audio_cache.store, cache_key, audio_name)
+        return audio_name
+
+    async def render_audio(self, text, language, used=None):
+        """Sintetizar y transcodificar a formato Asterisk, en memoria"""
+        # Los motores son bloqueantes (HTTP o proceso): se ejecutan en el pool de E/S
+        started = self.loop.time()
+        engine, source_bytes, source_format = await self.run_io(self.engines.synthesize, text, language)
+        elapsed = self.loop.time() - started
+        STEP_SECONDS.labels('synthesis').observe(elapsed)
+        ENGINE_SECONDS.labels(engine).observe(elapsed)
+        if used is not None:
+            used.add(engine)
+        if engine != self.engines.primary:
+            logger.info(f"🔀 Audio generado con el motor de respaldo {engine}")
+
+        # Transcodificación (ffmpeg) en el pool de CPU
+        with STEP_SECONDS.labels('transcode').time():
+            return await self.run_cpu(transcode_for_asterisk, source_bytes, source_format, AUDIO_FORMAT)
+
+    async def synthesize_audio(self, text, language, audio_name, used=None):
+        """Sintetizar audio y guardarlo como sonido Asterisk"""
+        try:
+            logger.info(f"🎵 Generando audio TTS: {text[:50]}...")
+
+            audio_bytes = await self.render_audio(text, language, used)
+
+            gsm_file = f'{ASTERISK_SOUNDS_DIR}/{audio_name}.{AUDIO_FORMAT}'
+            with STEP_SECONDS.labels('write').time():
+                await self.run_io(atomic_write, gsm_file, audio_bytes)
+
+            logger.info(f"✅ Audio TTS generado: {audio_name}.{AUDIO_FORMAT}")
+            return audio_name
+
+        except Exception as e:
+            logger.error(f"❌ Error generando audio TTS: {e}")
+            raise
+
+    async def synthesize_chunked(self, chunks, text, language, audio_name, used=None):
+        """Sintetizar un texto largo por fragmentos concurrentes y concatenarlos"""
+        try:
+            logger.info(f"🧩 Generando audio TTS en {len(chunks)} fragmentos: {text[:50]}...")
+
+            parts = await asyncio.gather(*(self.chunk_audio(chunk, language, used) for chunk in chunks))
+            audio_bytes = await self.run_cpu(concatenate_audio, parts, AUDIO_FORMAT)
+
+            gsm_file = f'{ASTERISK_SOUNDS_DIR}/{audio_name}.{AUDIO_FORMAT}'
+            with STEP_SECONDS.labels('write').time():
+                await self.run_io(atomic_write, gsm_file, audio_bytes)
+
+            logger.info(f"✅ Audio TTS generado: {audio_name}.{AUDIO_FORMAT}")
+            return audio_name
+
+        except Exception as e:
+            logger.error(f"❌ Error generando audio TTS por fragmentos: {e}")
+            raise
+
+    async def chunk_audio(self, chunk, language, used=None):
+        """Audio de un fragmento, desde el cache si existe"""
+        if self.audio_cache is None:
+            return await self.render_audio(chunk, language, used)
+
+        audio_name = await self.cached_audio(chunk, language, self.synthesize_audio, used)
+        try:
+            return await self.run_io(read_file, self.audio_cache.path_for(audio_name, AUDIO_FORMAT))
+        except FileNotFoundError:
+            # Desalojado entre la búsqueda y la lectura
+            return await self.render_audio(chunk, language, used)
+
+    async def load_template(self, template_id):
+        template = decode_template(await self.redis.hgetall(template_key(template_id)))
+        if template is None:
+            raise PermanentJobError(f'Plantilla {template_id} no encontrada')
+        return template
+
+    async def generate_template_audio(self, job_data):
+        """Generar el audio de un trabajo con plantilla (cacheado por texto final)"""
+        template = await self.load_template(job_data['template_id'])
+        language = template['language']
+        produce = functools.partial(
+            self.synthesize_template, template, job_data.get('variables', {})
+        )
+
+        if self.audio_cache is None:
+            return await produce(job_data['text'], language, await self.job_sound_name())
+        return await self.cached_audio(job_data['text'], language, produce)
+
+    async def synthesize_template(self, template, variables, text, language, audio_name, used=None):
+        """Unir los fragmentos estáticos pre-renderizados con el audio de las variables"""
+        try:
+            logger.info(f"🧩 Generando audio de plantilla {template['template_id']}: {text[:50]}...")
+
+            parts = await asyncio.gather(*(
+                self.fragment_audio(part_text, language, used) if kind == 'static'
+                else self.chunk_audio(part_text, language, used)
+                for kind, part_text in template_parts(template, variables)
+            ))
+            audio_bytes = await self.run_cpu(concatenate_audio, parts, AUDIO_FORMAT)
+
+            gsm_file = f'{ASTERISK_SOUNDS_DIR}/{audio_name}.{AUDIO_FORMAT}'
+            with STEP_SECONDS.labels('write').time():
+                await self.run_io(atomic_write, gsm_file, audio_bytes)
+
+            logger.info(f"✅ Audio TTS generado: {audio_name}.{AUDIO_FORMAT}")
+            return audio_name
+
+        except Exception as e:
+            logger.error(f"❌ Error generando audio de plantilla: {e}")
+            raise
+
+    async def fragment_audio(self, text, language, used=None):
+        """Audio de un fragmento estático (con el nombre del motor que lo generó)"""
+        engine = self.engines.active()
+        try:
+            audio_bytes = await self.run_io(read_file, fragment_path(text, language, engine))
+            if used is not None:
+                used.add(engine)
+            return audio_bytes
+        except FileNotFoundError:
+            produced = set()
+            audio_bytes = await self.render_audio(text, language, produced)
+            with STEP_SECONDS.labels('write').time():
+                await self.run_io(atomic_write, fragment_path(text, language, next(iter(produced))), audio_bytes)
+            if used is not None:
+                used.update(produced)
+            return audio_bytes
+
+    async def prerender_template(self, template_id):
+        """Sintetizar de antemano los fragmentos estáticos de una plantilla"""
+        key = template_key(template_id)
+        template = decode_template(await self.redis.hgetall(key))
+        if template is None:
+            # Borrada antes de pre-renderizar: no hay nada que reintentar
+            logger.warning(f"⚠️ Plantilla {template_id} no encontrada, se omite")
+            return
+
+        try:
+            statics = [text for kind, text in template_parts(template, {}) if kind == 'static']
+            await asyncio.gather(*(
+                self.fragment_audio(text, template['language']) for text in statics
+            ))
+            await self.redis.hset(key, mapping={
+                'status': 'ready',
+                'fragments': len(statics),
+                'prerendered_at': datetime.now().isoformat()
+            })
+            logger.info(f"✅ Plantilla {template_id} pre-renderizada ({len(statics)} fragmentos)")
+        except Exception as e:
+            logger.error(f"❌ Error pre-renderizando plantilla {template_id}: {e}")
+            await self.redis.hset(key, mapping={'status': 'failed', 'error': str(e)})
+            raise
+
+    async def admit_call(self, job_id):
+        """Esperar canal libre en el troncal y turno de ritmo sin ocupar hilos"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CALL_ADMISSION_TIMEOUT
+        while True:
+            admitted, delay = await self.run_io(self.admission.try_acquire, job_id)
+            if admitted:
+                return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"Troncal {SIP_TRUNK} sin canales libres tras {CALL_ADMISSION_TIMEOUT}s")
+            await asyncio.sleep(min(delay, remaining))
+
+    async def create_asterisk_call(self, job_data, audio_filename):
+        """Originar la llamada en Asterisk; devuelve los campos a guardar en el trabajo"""
+        job_id = job_data['job_id']
+        admitted = False
+        try:
+            if self.admission is not None:
+                with STEP_SECONDS.labels('admission').time():
+                    await self.admit_call(job_id)
+                admitted = True
+
+            if self.outcomes is not None:
+                # Guardar 'dialing' antes de originar: el resultado puede
+                # llegar antes de que originate devuelva
+                job_data['status'] = 'dialing'
+                job_data['dialing_at'] = datetime.now().isoformat()
+                job_data['audio_file'] = audio_filename
+                await self.save_job(job_data)
+
+            with STEP_SECONDS.labels('originate').time():
+                return await self.run_io(
+                    self.originator.originate, job_data['phone_number'], audio_filename, job_id
+                )
+
+        except Exception as e:
+            logger.error(f"❌ Error creando llamada Asterisk: {e}")
+            if admitted:
+                await self.run_io(self.admission.release, job_id)
+            raise
+
+    def call_done(self, job_id, fields, variables):
+        """La llamada terminó: liberar su canal y registrar el resultado (hilo del vigilante o del lector AMI)"""
+        status = fields.get('Status', 'desconocido')
+        if self.admission is not None and self.admission.release(job_id):
+            logger.info(f"📴 Llamada {job_id} terminada ({status}), canal liberado")
+        if self.outcomes is not None:
+            self.outcomes.ended(
+                job_id, self.originator.outcome(fields),
+                at=fields.get('Time'), detail=fields.get('Reason') or status
+            )
+        if self.sound_files is not None and variables.get('AUDIO_FILE'):
+            self.release_sound(variables['AUDIO_FILE'], job_id)
+
+    def call_answered(self, job_id, at):
+        """La llamada fue contestada (hilo del lector AMI)"""
+        if self.outcomes is not None:
+            self.outcomes.answered(job_id, at)
+
+    async def publish_result(self, job_data):
+        """Enviar el trabajo a tts_results"""
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(body=json.dumps(job_data).encode()),
+            routing_key='tts_results'
+        )
+
+    def publish_result_threadsafe(self, job_data):
+        asyncio.run_coroutine_threadsafe(self.publish_result(job_data), self.loop)
+
+    async def template_job(self, message):
+        """Etapa de plantillas: pre-renderizar los fragmentos estáticos"""
+        await self.prerender_template(message['template_id'])
+
+    async def synthesize_job(self, job_data):
+        """
+        Etapa de síntesis: generar el audio del trabajo y pasarlo a tts_ready
+        para la etapa de marcación.
+        """
+        job_id = job_data['job_id']
+        audio_filename = None
+
+        try:
+            logger.info(f"🔄 Sintetizando trabajo {job_id}")
+
+            # Actualizar estado del trabajo y del worker en una sola llamada
+            job_data['status'] = 'processing'
+            job_data['processed_at'] = datetime.now().isoformat()
+            job_data['worker_id'] = self.worker_id
+            pipe = self.redis.pipeline()
+            await self.save_job(job_data, pipe)
+            await self.job_started(job_id, pipe)
+            await self.execute(pipe)
+
+            # Generar audio TTS (solo las variables si el trabajo usa plantilla)
+            started = self.loop.time()
+            if job_data.get('template_id'):
+                audio_filename = await self.generate_template_audio(job_data)
+            else:
+                audio_filename = await self.generate_tts_audio(
+                    job_data['text'],
+                    job_data.get('language', 'es')
+                )
+            synthesis_time = round(self.loop.time() - started, 3)
+
+            # El sonido queda referenciado hasta que termine la llamada
+            if self.sound_files is not None:
+                await self.run_io(self.sound_files.acquire, audio_filename, job_id)
+
+            job_data['status'] = 'ready'
+            job_data['ready_at'] = datetime.now().isoformat()
+            job_data['audio_file'] = audio_filename
+            job_data['synthesis_time'] = synthesis_time
+            pipe = self.redis.pipeline()
+            await self.save_job(job_data, pipe)
+            queue_stage_sample(pipe, 'synth', synthesis_time)
+            queue_worker_increment(pipe, self.worker_id, 'synthesized_jobs')
+            await self.job_finished(job_id, pipe)
+            await self.execute(pipe)
+
+            logger.info(f"🎧 Trabajo {job_id} con audio listo ({synthesis_time}s)")
+            return ready_queue(job_data), job_data
+
+        except Exception as e:
+            logger.error(f"❌ Error sintetizando trabajo {job_id}: {e}")
+            # El reintento genera (o toma del cache) su sonido
+            if self.sound_files is not None and audio_filename:
+                await self.run_io(self.release_sound, audio_filename, job_id)
+            await self.job_failed(job_data, e)
+            raise
+
+    async def dial_job(self, job_data):
+        """
+        Etapa de marcación: esperar un canal del troncal y originar la
+        llamada con el audio ya generado.
+        """
+        job_id = job_data['job_id']
+        audio_filename = job_data.get('audio_file')
+        call_info = None
+
+        try:
+            logger.info(f"📞 Marcando trabajo {job_id}")
+            await self.job_started(job_id)
+
+            # Con la referencia vencida el sonido pudo borrarse: el
+            # reintento vuelve a la síntesis
+            if not audio_filename or not os.path.exists(
+                    f'{ASTERISK_SOUNDS_DIR}/{audio_filename}.{AUDIO_FORMAT}'):
+                raise FileNotFoundError(f"Audio {audio_filename} no disponible")
+
+            # Crear llamada Asterisk
+            job_data['dial_worker_id'] = self.worker_id
+            call_info = await self.create_asterisk_call(job_data, audio_filename)
+            ready_wait = seconds_between(
+                job_data.get('ready_at'), job_data.get('dialing_at') or datetime.now().isoformat()
+            )
+
+            pipe = self.redis.pipeline()
+            queue_stage_sample(pipe, 'dial', ready_wait)
+            queue_worker_increment(pipe, self.worker_id, 'processed_jobs')
+
+            if self.outcomes is not None:
+                # El trabajo sigue en 'dialing' hasta que Asterisk informe el
+                # resultado, que lo cierra y lo envía a tts_results
+                await self.run_io(self.outcomes.update, job_id, 'dialing', dict(call_info, ready_wait=ready_wait))
+                await self.job_finished(job_id, pipe)
+                await self.execute(pipe)
+                logger.info(f"✅ Trabajo {job_id} entregado a Asterisk, marcando")
+                return None
+
+            # Marcar como completado, contar el trabajo y actualizar el worker
+            # en una sola llamada
+            job_data['status'] = 'completed'
+            job_data['completed_at'] = datetime.now().isoformat()
+            job_data['ready_wait'] = ready_wait
+            job_data.update(call_info)
+            await self.save_job(job_data, pipe)
+            await self.job_finished(job_id, pipe)
+            await self.execute(pipe)
+
+            # Enviar resultado a cola de resultados
+            await self.publish_result(job_data)
+
+            logger.info(f"✅ Trabajo {job_id} completado exitosamente")
+            return None
+
+        except Exception as e:
+            logger.error(f"❌ Error marcando trabajo {job_id}: {e}")
+            # Sin llamada se suelta el sonido; si la llamada ya salió, se
+            # suelta al terminar
+            if self.sound_files is not None and audio_filename and call_info is None:
+                await self.run_io(self.release_sound, audio_filename, job_id)
+            await self.job_failed(job_data, e)
+            raise
+
+    async def job_failed(self, job_data, error):
+        """
+        Registrar el fallo con la misma decisión que tomará handle_message
+        con el mensaje: reintento diferido o fallo definitivo (tts_dead).
+        """
+        job_id = job_data['job_id']
+        attempts = job_data.get('attempts', 0) + 1
+        delay = self.retry_policy.delay_for(attempts, error)
+        job_data['attempts'] = attempts
+        job_data['error'] = str(error)
+        if delay is not None:
+            job_data['status'] = 'retrying'
+            job_data['next_retry_at'] = (datetime.now() + timedelta(seconds=delay)).isoformat()
+        else:
+            job_data['status'] = 'failed'
+            job_data['failed_at'] = datetime.now().isoformat()
+            job_data['error_type'] = 'permanent' if is_permanent(error) else 'exhausted'
+        pipe = self.redis.pipeline()
+        await self.save_job(job_data, pipe)
+        await self.job_finished(job_id, pipe)
+        await self.execute(pipe)
+
+        # Los fallos definitivos también van al historial
+        if delay is None:
+            await self.publish_result(job_data)
+
+    async def handle_message(self, stage, message):
+        """
+        Procesar un mensaje de una etapa y confirmarlo; si pasa a la etapa
+        siguiente se publica antes de confirmar y si falla se reprograma o
+        se envía a tts_dead.
+        """
+        stage.scheduled.add(message.delivery_tag)
+        started = self.loop.time()
+        try:
+            job_data = decode_job(message.body, stage.required)
+            observe_queue_wait(job_data, stage.name)
+            try:
+                forward = await stage.handler(job_data)
+            except Exception:
+                STAGE_SECONDS.labels(stage.name, 'error').observe(self.loop.time() - started)
+                raise
+            STAGE_SECONDS.labels(stage.name, 'ok').observe(self.loop.time() - started)
+            settle_started = self.loop.time()
+            if forward is not None:
+                queue, job_data = forward
+                await stage.channel.default_exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(job_data).encode(),
+                        message_id=job_data['job_id'],
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                    ),
+                    routing_key=queue
+                )
+            await message.ack()
+            RABBITMQ_SECONDS.labels('settle').observe(self.loop.time() - settle_started)
+
+        except Exception as e:
+            logger.error(f"❌ Error en etapa {stage.name}: {e}")
+            try:
+                await self.reroute_failed(message, e)
+                await message.ack()
+            except Exception as reroute_error:
+                # Solo si no se pudo reprogramar vuelve directo a la cola
+                logger.error(f"❌ No se pudo reprogramar el mensaje fallido: {reroute_error}")
+                await message.nack(requeue=True)
+        finally:
+            stage.scheduled.discard(message.delivery_tag)
+
+    async def reroute_failed(self, message, error):
+        """Publicar un mensaje fallido en su cola de espera o en tts_dead"""
+        queue = retry_source(message.routing_key, message.body)
+        target, body, headers, delay = self.retry_policy.route(queue, message.body, error)
+        if delay is not None and target not in self.retry_queues:
+            await self.channel.declare_queue(
+                target, durable=True, arguments=self.retry_policy.retry_arguments(queue, delay)
+            )
+            self.retry_queues.add(target)
+
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=body.encode() if isinstance(body, str) else body,
+                headers=headers,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+            ),
+            routing_key=target
+        )
+        if delay is not None:
+            logger.warning(f"🔁 Mensaje de {queue} reintentará en {delay}s ({target})")
+        else:
+            logger.error(f"💀 Mensaje de {queue} enviado a {DEAD_QUEUE}: {error}")
+
+    async def on_message(self, stage, message):
+        """Callback de aio-pika: cada mensaje se procesa en su propia tarea"""
+        task = asyncio.create_task(self.handle_message(stage, message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def next_message(self, stage):
+        """Siguiente mensaje de la etapa según su planificador de prioridad, o None"""
+        queues = self.stage_queues[stage.name]
+        for queue in stage.scheduler.order():
+            message = await queues[queue].get(no_ack=False, fail=False)
+            stage.scheduler.record(queue, message is not None)
+            if message is not None:
+                return message
+        return None
+
+    async def ready_depth(self):
+        """Trabajos con audio listo esperando marcación, entre todos los workers"""
+        now = self.loop.time()
+        if now - self.ready_depth_at >= READY_DEPTH_INTERVAL:
+            depth = 0
+            for queue in READY_QUEUES:
+                declared = await self.channel.declare_queue(queue, passive=True)
+                depth += declared.declaration_result.message_count
+            self.ready_depth_value = depth
+            self.ready_depth_at = now
+        return self.ready_depth_value
+
+    async def schedule_loop(self, stage):
+        """
+        Tomar trabajos de una etapa con su planificador de prioridad mientras
+        tenga huecos. La síntesis no toma trabajos mientras haya
+        PIPELINE_LOOKAHEAD o más con el audio listo.
+        """
+        slots = asyncio.Semaphore(stage.concurrency)
+        while not self.stop_event.is_set():
+            await slots.acquire()
+            if stage.name == 'synth' and await self.ready_depth() >= PIPELINE_LOOKAHEAD:
+                slots.release()
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+            with RABBITMQ_SECONDS.labels('get').time():
+                message = await self.next_message(stage)
+            if message is None:
+                slots.release()
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+
+            task = asyncio.create_task(self.handle_message(stage, message))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def start_consuming(self):
+        """Iniciar consumo de mensajes hasta recibir señal de parada"""
+        logger.info(f"🚀 Worker {self.worker_id} iniciando consumo...")
+
+        # Las plantillas siempre llegan por consumidor propio
+        scheduled = [stage for stage in self.stages if stage.scheduler is not None]
+        for stage in self.stages:
+            if stage.scheduler is None or WORKER_SCHEDULER != 'weighted':
+                # Consumidores por cola (prioridad primero)
+                for queue in stage.queues:
+                    await self.stage_queues[stage.name][queue].consume(
+                        functools.partial(self.on_message, stage)
+                    )
+
+        logger.info(f"✅ Worker {self.worker_id} listo para procesar trabajos")
+        if WORKER_SCHEDULER == 'weighted':
+            stop = asyncio.create_task(self.stop_event.wait())
+            loops = [asyncio.create_task(self.schedule_loop(stage)) for stage in scheduled]
+            done, _ = await asyncio.wait([stop] + loops, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            for loop in loops:
+                loop.cancel()
+            for loop in loops:
+                if loop in done:
+                    # Propagar errores de conexión del planificador
+                    loop.result()
+        else:
+            await self.stop_event.wait()
+
+    async def stop(self):
+        """Detener worker"""
+        self.stop_event.set()
+        if self.done_watcher:
+            self.done_watcher.stop_event.set()
+        if self.originator:
+            self.originator.stop()
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        for stage in self.stages:
+            if stage.channel:
+                await stage.channel.close()
+        if self.channel:
+            await self.channel.close()
+        if self.tasks:
+            # Los mensajes sin confirmar vuelven a la cola al cerrar el canal
+            for task in self.tasks:
+                task.cancel()
+        if self.connection:
+            await self.connection.close()
+
+        if self.redis:
+            await queue_worker_removal(self.redis.pipeline(), self.worker_id).execute()
+            await self.redis.close()
+        self.io_executor.shutdown(wait=False, cancel_futures=True)
+        self.cpu_executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"🛑 Worker {self.worker_id} detenido")
+
+
+async def run():
+    worker = AsyncTTSWorker()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop_event.set)
+
+    try:
+        await worker.connect()
+        await worker.start_consuming()
+    except Exception as e:
+        logger.error(f"❌ Error fatal en worker: {e}")
+    finally:
+        await worker.stop()
+
+
+def main():
+    """Función principal"""
+    logger.info(f"🚀 Iniciando TTS Worker asyncio {WORKER_ID}")
+    logger.info(f"📡 RabbitMQ: {RABBITMQ_URL}")
+    logger.info(f"📊 Redis: {REDIS_URL}")
+    logger.info(f"🔧 Etapas: {WORKER_ROLE} (síntesis: {SYNTH_CONCURRENCY}, marcación: {DIAL_CONCURRENCY}, "
+                f"adelanto: {PIPELINE_LOOKAHEAD})")
+    logger.info(f"🗣️ Motores TTS: {', '.join(TTS_ENGINES)}")
+
+    start_metrics_server(WORKER_METRICS_PORT)
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Métricas Prometheus de los workers: histogramas por paso y contadores
+"""
+
+import logging
+from datetime import datetime
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Cubos de segundos: de operaciones de Redis (ms) a esperas de canal (minutos)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+QUEUE_WAIT = Histogram(
+    'tts_queue_wait_seconds',
+    'Espera del trabajo en la cola de la etapa hasta que un worker lo toma',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+STEP_SECONDS = Histogram(
+    'tts_step_seconds',
+    'Duración de cada paso de un trabajo (synthesis, transcode, write, admission, originate)',
+    ['step'], buckets=LATENCY_BUCKETS
+)
+ENGINE_SECONDS = Histogram(
+    'tts_engine_seconds',
+    'Duración de cada síntesis por motor TTS',
+    ['engine'], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    'tts_stage_seconds',
+    'Duración total de un mensaje en su etapa, por resultado',
+    ['stage', 'result'], buckets=LATENCY_BUCKETS
+)
+REDIS_SECONDS = Histogram(
+    'tts_redis_seconds',
+    'Duración de las llamadas a Redis del worker',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+RABBITMQ_SECONDS = Histogram(
+    'tts_rabbitmq_seconds',
+    'Duración de las llamadas a RabbitMQ del worker',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    'tts_cache_lookups_total',
+    'Búsquedas en el cache de audio',
+    ['result']
+)
+
+
+def queued_since(job_data, stage):
+    """Hora ISO en que el mensaje entró en la cola de la etapa"""
+    if stage == 'dial':
+        return job_data.get('ready_at')
+    return job_data.get('next_retry_at') or job_data.get('replayed_at') or job_data.get('created_at')
+
+
+def observe_queue_wait(job_data, stage):
+    since = queued_since(job_data, stage)
+    if not since:
+        return
+    try:
+        wait = (datetime.now() - datetime.fromisoformat(since)).total_seconds()
+    except (TypeError, ValueError):
+        return
+    QUEUE_WAIT.labels(stage).observe(max(wait, 0.0))
+
+
+def start_metrics_server(port):
+    """Servir /metrics en un hilo propio (0 lo desactiva)"""
+    if not port:
+        return
+    try:
+        start_http_server(port)
+    except OSError as e:
+        # Puerto ocupado (p. ej. otro worker en la misma máquina): se sigue sin /metrics
+        logger.warning(f"⚠️ No se pudo abrir /metrics en el puerto {port}: {e}")